@@ -0,0 +1,123 @@
+# alert_queue.py
+import contextvars
+import logging
+import queue
+import threading
+import time
+
+
+class AlertQueue:
+    """A bounded queue of tachycardia emails sent by background workers.
+
+    The server puts the alerts in the queue and returns at once, while
+    the worker threads hand them to the mail transport. A failed mail
+    is retried with an exponential backoff before it is dropped. The
+    workers are started with the first alert.
+
+    Attributes:
+        transport (callable): sends one mail with the arguments of
+            (to_email, alerts) and raises an error if it fails.
+        workers (int): the number of worker threads.
+        retries (int): the number of retries of a failed mail.
+        backoff (float): the seconds to wait before the first retry,
+            doubled at each of the next retries.
+    """
+
+    def __init__(self, transport, workers=2, maxsize=1000,
+                 retries=3, backoff=0.5):
+        self.transport = transport
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.queue = queue.Queue(maxsize)
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads if they are not running yet.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.threads:
+                return None
+            for i in range(self.workers):
+                t = threading.Thread(target=self.work,
+                                     name="alert-worker-{}".format(i),
+                                     daemon=True)
+                t.start()
+                self.threads.append(t)
+        return None
+
+    def put(self, to_email, alerts):
+        """Put a mail in the queue without waiting.
+
+        The mail is sent in a copy of the context variables of the
+        caller, so the log records of the worker keep the request id.
+
+        Args:
+            to_email (string): the receiver's email
+            alerts (list): the (p_id, hr, time) of each tachycardic
+                heart rate in the mail.
+
+        Returns:
+            bool: True if the alert is queued;
+                  False if the queue is full and the alert is dropped.
+        """
+        self.start()
+        try:
+            self.queue.put_nowait((to_email, alerts,
+                                   contextvars.copy_context()))
+        except queue.Full:
+            logging.error("* Alert queue is full, dropped the email to {}."
+                          .format(to_email))
+            return False
+        return True
+
+    def send(self, alert):
+        """Send an alert through the transport with retries.
+
+        Args:
+            alert (tuple): the (to_email, alerts) of the mail.
+
+        Returns:
+            bool: True if the mail is sent; False if all tries failed.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                status = self.transport(*alert)
+            except Exception as e:
+                logging.warning("* Failed to send the email to {}: {}"
+                                .format(alert[0], e))
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+            else:
+                logging.info("* Sent the email to {}, status {}."
+                             .format(alert[0], status),
+                             extra={"alerts": len(alert[1])})
+                return True
+        logging.error("* Gave up the email to {}.".format(alert[0]))
+        return False
+
+    def work(self):
+        """Send the queued alerts forever, used by the worker threads.
+
+        Returns:
+            None
+        """
+        while True:
+            to_email, alerts, context = self.queue.get()
+            try:
+                context.run(self.send, (to_email, alerts))
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Wait until all of the queued alerts are handled.
+
+        Returns:
+            None
+        """
+        self.queue.join()
+        return None
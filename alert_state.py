@@ -0,0 +1,124 @@
+# alert_state.py
+import threading
+import time
+from shared_state import LocalState
+
+
+class AlertTracker:
+    """Follow the tachycardia episodes of the patients to limit emails.
+
+    Each heart rate moves the patient between "not tachycardic" and
+    "tachycardic". A patient entering an episode raises an alert, and
+    a patient staying tachycardic only raises a reminder once the
+    ``cooldown`` has passed since the last alert, which also stops an
+    episode flapping on and off from sending more emails. The alerts
+    of the same doctor are held for ``digest_window`` seconds and sent
+    together in one email.
+
+    The episodes are kept in a shared state, so the server processes
+    sharing it never alert the same episode twice within the cooldown.
+    The digests are held by each process.
+
+    Attributes:
+        dispatch (callable): sends the digest with the arguments of
+            (to_email, alerts), where alerts are (p_id, hr, time).
+        cooldown (float): the least seconds between two alerts of the
+            same patient.
+        digest_window (float): the seconds an alert waits for other
+            alerts of the same doctor; 0 to send it at once.
+        state (LocalState): the episode of each patient, with the keys
+            of "tachycardic" and "last_alert".
+        clock (callable): the clock of the alert times, which should
+            be the wall clock if the state is shared.
+        pending (dict): the alerts waiting for each doctor email.
+    """
+
+    def __init__(self, dispatch, cooldown=600, digest_window=30,
+                 state=None, clock=time.monotonic):
+        self.dispatch = dispatch
+        self.cooldown = cooldown
+        self.digest_window = digest_window
+        self.state = LocalState() if state is None else state
+        self.clock = clock
+        self.pending = {}
+        self.timers = {}
+        self.lock = threading.Lock()
+
+    def update(self, p_id, p_email, hr, timestamp, status, now=None):
+        """Update the episode of a patient with a new heart rate.
+
+        Args:
+            p_id (int): the patient id.
+            p_email (string): the doctor email.
+            hr (int): the heart rate.
+            timestamp (string): the timestamp of the heart rate.
+            status (string): "tachycardic" or "not tachycardic".
+            now (float): the time of the update by ``clock``, which
+                is the current time if it's not given.
+
+        Returns:
+            string: the transition of "enter", "sustain" or "exit";
+            None if the patient stays not tachycardic.
+        """
+        if now is None:
+            now = self.clock()
+
+        def step(old):
+            episode = old or {"tachycardic": False, "last_alert": None}
+            if status != "tachycardic":
+                if not episode["tachycardic"]:
+                    return old, (None, False)
+                return dict(episode, tachycardic=False), ("exit", False)
+            transition = "sustain" if episode["tachycardic"] else "enter"
+            last = episode["last_alert"]
+            if last is not None and now - last < self.cooldown:
+                return dict(episode, tachycardic=True), (transition, False)
+            return ({"tachycardic": True, "last_alert": now},
+                    (transition, True))
+
+        key = "episode:{}".format(p_id)
+        if status != "tachycardic":
+            episode = self.state.get(key)
+            if episode is None or not episode["tachycardic"]:
+                return None
+        transition, alert = self.state.update(key, step)
+        if not alert:
+            return transition
+        flush = False
+        with self.lock:
+            self.pending.setdefault(p_email, []).append(
+                (p_id, hr, timestamp))
+            if self.digest_window <= 0:
+                flush = True
+            elif p_email not in self.timers:
+                timer = threading.Timer(self.digest_window, self.flush,
+                                        [p_email])
+                timer.daemon = True
+                self.timers[p_email] = timer
+                timer.start()
+        if flush:
+            self.flush(p_email)
+        return transition
+
+    def flush(self, p_email=None):
+        """Dispatch the pending alerts of a doctor, or of all doctors.
+
+        Args:
+            p_email (string): the doctor email; None for all doctors.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            emails = list(self.pending) if p_email is None else [p_email]
+            digests = []
+            for to_email in emails:
+                timer = self.timers.pop(to_email, None)
+                if timer is not None:
+                    timer.cancel()
+                alerts = self.pending.pop(to_email, None)
+                if alerts:
+                    digests.append((to_email, alerts))
+        for to_email, alerts in digests:
+            self.dispatch(to_email, alerts)
+        return None
@@ -0,0 +1,283 @@
+# hr_asgi.py
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import parse_qs
+import hr_server
+from status_stream import sse_event
+
+STREAM_PATH = "/api/status/stream"
+
+
+def wsgi_environ(scope, body):
+    """Build the WSGI environ of an ASGI http request.
+
+    Args:
+        scope (dict): the ASGI scope of the request.
+        body (bytes): the whole request body.
+
+    Returns:
+        dict: the WSGI environ.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "")
+        .encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = value.decode("latin1")
+        if name in environ:
+            value = environ[name] + "," + value
+        environ[name] = value
+    return environ
+
+
+def start_wsgi(app, environ):
+    """Call a WSGI app until the first chunk of its response.
+
+    Args:
+        app (callable): the WSGI app.
+        environ (dict): the WSGI environ of the request.
+
+    Returns:
+        string: the status line of the response.
+        list: the (name, value) of the response headers.
+        bytes: the first chunk of the body, None if it is empty.
+        iterator: the rest of the body.
+        iterable: the response iterable to close at the end.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    response = app(environ, start_response)
+    chunks = iter(response)
+    first = next(chunks, None)
+    return started[0], started[1], first, chunks, response
+
+
+def latest_statuses(p_ids, state):
+    """Get the latest status of each patient of a stream.
+
+    Args:
+        p_ids (list): the patient ids.
+        state (ServerState): the server objects of the app.
+
+    Returns:
+        list: the "status" events of the patients.
+    """
+    return [sse_event("status", dict(hr_server.latest_status(p_id, state)[0],
+                                     patient_id=p_id))
+            for p_id in p_ids]
+
+
+class AsgiServer:
+    """Serve the routes of hr_server to an ASGI server such as uvicorn.
+
+    The status streams, which are held open by the monitors, are
+    served by coroutines, so a waiting monitor only holds a coroutine
+    instead of a thread. The other routes are run by the Flask app in
+    a bounded pool of threads, where their blocking storage calls
+    don't stop the event loop.
+
+    Attributes:
+        app (Flask): the app of the routes.
+        pool (ThreadPoolExecutor): the threads of the Flask routes.
+        keep_alive (float): the seconds between the keep-alive
+            comments of an idle stream.
+        on_startup (callable): called once before the first request,
+            and returns the app which replaces ``app`` if it isn't None.
+    """
+
+    def __init__(self, app=None, workers=32, keep_alive=15,
+                 on_startup=None):
+        self.app = hr_server.app if app is None else app
+        self.pool = ThreadPoolExecutor(workers,
+                                       thread_name_prefix="hr-asgi")
+        self.keep_alive = keep_alive
+        self.on_startup = on_startup
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"] == STREAM_PATH and scope["method"] == "GET":
+                await self.stream(scope, receive, send)
+            else:
+                await self.wsgi(scope, receive, send)
+
+    def run(self, func, *args):
+        """Run a blocking function in the pool of threads.
+
+        Args:
+            func (callable): the function.
+            *args: the arguments of the function.
+
+        Returns:
+            Future: the awaitable result of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.pool, func, *args)
+
+    async def lifespan(self, receive, send):
+        """Start and stop the server with the ASGI lifespan events.
+
+        Args:
+            receive (callable): the ASGI receive channel.
+            send (callable): the ASGI send channel.
+
+        Returns:
+            None
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.on_startup is not None:
+                    app = await self.run(self.on_startup)
+                    if app is not None:
+                        self.app = app
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return None
+
+    async def wsgi(self, scope, receive, send):
+        """Run a request by the Flask app.
+
+        The body of the request is read before the app is called, and
+        the response is sent one chunk at a time, so a streamed list
+        of heart rates is never all in memory.
+
+        Args:
+            scope (dict): the ASGI scope of the request.
+            receive (callable): the ASGI receive channel.
+            send (callable): the ASGI send channel.
+
+        Returns:
+            None
+        """
+        body = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            body.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        environ = wsgi_environ(scope, b"".join(body))
+        status, headers, chunk, chunks, response = await self.run(
+            start_wsgi, self.app, environ)
+        try:
+            await send({"type": "http.response.start",
+                        "status": int(status.split(" ", 1)[0]),
+                        "headers": [(name.lower().encode("latin1"),
+                                     value.encode("latin1"))
+                                    for name, value in headers]})
+            while chunk is not None:
+                if chunk:
+                    await send({"type": "http.response.body",
+                                "body": chunk, "more_body": True})
+                chunk = await self.run(next, chunks, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(response, "close"):
+                await self.run(response.close)
+        return None
+
+    async def stream(self, scope, receive, send):
+        """Stream the heart rates of some patients with Server-Sent Events.
+
+        The events are the same as the ones of the
+        /api/status/stream route of hr_server. The stream ends when
+        the client disconnects.
+
+        Args:
+            scope (dict): the ASGI scope of the request.
+            receive (callable): the ASGI receive channel.
+            send (callable): the ASGI send channel.
+
+        Returns:
+            None
+        """
+        state = hr_server.app_state(self.app)
+        args = parse_qs(scope.get("query_string", b"").decode("latin1"))
+        p_ids = await self.run(hr_server.validate_stream_ids,
+                               args.get("patient_id", [""])[0], state)
+        if p_ids is False:
+            await send({"type": "http.response.start", "status": 400,
+                        "headers": [(b"content-type",
+                                     b"text/html; charset=utf-8")]})
+            await send({"type": "http.response.body",
+                        "body": b"Please enter existing numeric "
+                                b"patient IDs."})
+            return None
+        sub = state.status_broker.subscribe(p_ids,
+                                            asyncio.get_running_loop())
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            sub.ready.set()
+
+        watcher = asyncio.ensure_future(disconnected())
+        try:
+            events = await self.run(latest_statuses, p_ids, state)
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type",
+                                     b"text/event-stream; charset=utf-8"),
+                                    (b"cache-control", b"no-cache")]})
+            while not watcher.done():
+                for event in events:
+                    await send({"type": "http.response.body",
+                                "body": event.encode("utf8"),
+                                "more_body": True})
+                event = await sub.wait(self.keep_alive)
+                if event is None:
+                    events = [": keep-alive\n\n"]
+                else:
+                    events = [sse_event(*event)]
+        finally:
+            watcher.cancel()
+            state.status_broker.unsubscribe(sub)
+        return None
+
+
+def start_server():
+    """Initialize hr_server from the HR_CONFIG file and the environment.
+
+    Each worker process of the server runs it once at startup.
+
+    Returns:
+        Flask: the app of hr_server.create_app.
+    """
+    return hr_server.init_server()
+
+
+application = AsgiServer(on_startup=start_server)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(application, host="0.0.0.0", port=5000)
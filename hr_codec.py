@@ -0,0 +1,141 @@
+# hr_codec.py
+TACHYCARDIC = "tachycardic"
+NOT_TACHYCARDIC = "not tachycardic"
+
+
+def zigzag(n):
+    """Map a signed integer to an unsigned one, small values first.
+
+    Args:
+        n (int): the signed integer.
+
+    Returns:
+        int: 0, -1, 1, -2, 2... as 0, 1, 2, 3, 4...
+    """
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def unzigzag(n):
+    """Map an unsigned integer of zigzag back to the signed one.
+
+    Args:
+        n (int): the unsigned integer.
+
+    Returns:
+        int: the signed integer.
+    """
+    return n // 2 if n % 2 == 0 else -(n + 1) // 2
+
+
+def put_varint(buf, n):
+    """Append a signed integer to a buffer as a zigzag varint.
+
+    Each byte holds 7 bits of the value, the lowest first, and its
+    high bit is set when more bytes follow, so a small value takes a
+    single byte.
+
+    Args:
+        buf (bytearray): the buffer.
+        n (int): the signed integer.
+
+    Returns:
+        None
+    """
+    n = zigzag(n)
+    while n >= 0x80:
+        buf.append(n & 0x7f | 0x80)
+        n >>= 7
+    buf.append(n)
+    return None
+
+
+def get_varint(data, pos):
+    """Read a zigzag varint from the data.
+
+    Args:
+        data (bytes): the encoded data.
+        pos (int): the position of the first byte of the varint.
+
+    Returns:
+        int: the signed integer.
+        int: the position after the varint.
+    """
+    n = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return unzigzag(n), pos
+        shift += 7
+
+
+def encode_readings(readings):
+    """Encode the readings of a bucket into compact bytes.
+
+    The readings are stored as their number, then the times as the
+    first time, the first delta and the delta-of-delta of each other
+    time, then the heart rates as the first one and the delta of each
+    other one, all as varints, and last the statuses as a bitmap with
+    a set bit for tachycardic. Readings taken at a steady rate with a
+    slowly changing heart rate take about 2 bytes each.
+
+    Args:
+        readings (list): the readings sorted by time, each with the
+        keys of "t" (microseconds since the epoch), "hr" and "s".
+
+    Returns:
+        bytes: the encoded readings.
+    """
+    buf = bytearray()
+    put_varint(buf, len(readings))
+    prev_t = 0
+    prev_delta = 0
+    for r in readings:
+        delta = r["t"] - prev_t
+        put_varint(buf, delta - prev_delta)
+        prev_t = r["t"]
+        prev_delta = delta
+    prev_hr = 0
+    for r in readings:
+        put_varint(buf, r["hr"] - prev_hr)
+        prev_hr = r["hr"]
+    bitmap = bytearray((len(readings) + 7) // 8)
+    for i, r in enumerate(readings):
+        if r["s"] == TACHYCARDIC:
+            bitmap[i // 8] |= 1 << (i % 8)
+    buf.extend(bitmap)
+    return bytes(buf)
+
+
+def decode_readings(data):
+    """Decode the bytes of encode_readings back to the readings.
+
+    Args:
+        data (bytes): the encoded readings.
+
+    Returns:
+        list: the readings, each with the keys of "t", "hr" and "s".
+    """
+    n, pos = get_varint(data, 0)
+    times = []
+    t = 0
+    delta = 0
+    for i in range(n):
+        dod, pos = get_varint(data, pos)
+        delta += dod
+        t += delta
+        times.append(t)
+    hrs = []
+    hr = 0
+    for i in range(n):
+        d, pos = get_varint(data, pos)
+        hr += d
+        hrs.append(hr)
+    readings = []
+    for i in range(n):
+        tachy = data[pos + i // 8] >> (i % 8) & 1
+        readings.append({"t": times[i], "hr": hrs[i],
+                         "s": TACHYCARDIC if tachy else NOT_TACHYCARDIC})
+    return readings
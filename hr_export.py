@@ -0,0 +1,92 @@
+# hr_export.py
+import io
+import numpy as np
+
+# The types of the exported heart rates, the first one which holds all
+# of the heart rates of the patient is used.
+HR_TYPES = (np.int16, np.int32, np.int64)
+
+
+def hr_type(hrs):
+    """Get the smallest integer type of the exported heart rates.
+
+    Args:
+        hrs (list): the heart rates.
+
+    Returns:
+        type: int16 for any real heart rate, or int32 or int64 if a
+        value doesn't fit into it.
+    """
+    low = min(hrs, default=0)
+    high = max(hrs, default=0)
+    for dtype in HR_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return HR_TYPES[-1]
+
+
+def export_arrays(buckets):
+    """Pack the readings of a patient into typed arrays.
+
+    The heart rates are int16, unless a value needs the larger type
+    of hr_type, and the statuses are booleans, True for tachycardic.
+    The timestamps are int64 microseconds since the epoch,
+    delta-encoded: the first item is the time of the first reading
+    and each other item is the time since the reading before it, so
+    they stay small and compress well.
+
+    Args:
+        buckets (iterable): the lists of readings of the buckets in
+        time order, each reading with "t", "hr" and "s".
+
+    Returns:
+        dict: the "heart_rate", "tachycardic" and "timestamp_delta"
+        arrays.
+    """
+    hrs = []
+    statuses = []
+    times = []
+    for readings in buckets:
+        for r in readings:
+            hrs.append(r["hr"])
+            statuses.append(r["s"] == "tachycardic")
+            times.append(r["t"])
+    t = np.array(times, dtype=np.int64)
+    return {"heart_rate": np.array(hrs, dtype=hr_type(hrs)),
+            "tachycardic": np.array(statuses, dtype=np.bool_),
+            "timestamp_delta": np.diff(t, prepend=np.int64(0))}
+
+
+def export_npz(buckets):
+    """Write the readings of a patient as a compressed .npz file.
+
+    Args:
+        buckets (iterable): the lists of readings of the buckets in
+        time order, each reading with "t", "hr" and "s".
+
+    Returns:
+        bytes: the content of the .npz file with the arrays of
+        export_arrays.
+    """
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **export_arrays(buckets))
+    return buf.getvalue()
+
+
+def load_npz(data):
+    """Read an exported .npz file back to arrays.
+
+    Args:
+        data (bytes): the content of the .npz file.
+
+    Returns:
+        numpy.ndarray: the integer heart rates, int16 unless a value
+        needs a larger type.
+        numpy.ndarray: the boolean tachycardic statuses.
+        numpy.ndarray: the int64 timestamps in microseconds since
+        the epoch.
+    """
+    with np.load(io.BytesIO(data)) as arrays:
+        return (arrays["heart_rate"], arrays["tachycardic"],
+                np.cumsum(arrays["timestamp_delta"], dtype=np.int64))
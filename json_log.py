@@ -0,0 +1,138 @@
+# json_log.py
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, \
+    RotatingFileHandler, WatchedFileHandler
+
+# The correlation id of the request served by the current thread, which
+# is added to each log record as "request_id".
+current_request_id = contextvars.ContextVar("request_id", default=None)
+
+# The attributes of every log record, the other ones are the extra
+# fields given by the caller, eg: extra={"patient_id": 1}.
+RECORD_KEYS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) \
+    | {"message", "asctime", "request_id"}
+
+listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Add the request id of the current context to the log records."""
+
+    def filter(self, record):
+        record.request_id = current_request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a log record as a line of json.
+
+    The line has the "time" in UTC, the "level", the "logger", the
+    "message", the "request_id" if the record is logged by a request,
+    the extra fields of the record and the "exception" if any, eg:
+    {"time": "2019-11-16T15:27:17.548Z", "level": "INFO", ...}
+    """
+
+    def format(self, record):
+        created = datetime.fromtimestamp(record.created, timezone.utc)
+        entry = {"time": created.strftime("%Y-%m-%dT%H:%M:%S.")
+                 + "{:03d}Z".format(created.microsecond // 1000),
+                 "level": record.levelname,
+                 "logger": record.name,
+                 "message": record.getMessage()}
+        if getattr(record, "request_id", None) is not None:
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in RECORD_KEYS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RecordQueueHandler(QueueHandler):
+    """Put the log records in a queue without formatting them.
+
+    Only the message is merged with its arguments, which may change
+    after the call, so the json is made by the logging thread.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        return record
+
+
+def start_logging(path, level="INFO", max_bytes=10 * 1024 * 1024,
+                  backup_count=5):
+    """Log to a file of json lines written by a background thread.
+
+    The records are put in an unbounded queue with the request id,
+    and formatted and written by the logging thread, so a request
+    never waits for the json or the disk. The file
+    is appended to, and it's rotated when it reaches ``max_bytes``.
+    With several processes logging to the same file, set ``max_bytes``
+    to 0 and rotate it with an external tool such as logrotate: the
+    file is then reopened when it's moved away. The handlers of the
+    root logger are replaced.
+
+    Args:
+        path (string): the log file.
+        level (string): the lowest level logged, eg: "INFO".
+        max_bytes (int): the size of the file which is rotated, 0 to
+        never rotate it.
+        backup_count (int): the number of rotated files kept.
+
+    Returns:
+        QueueListener: the background writer of the file.
+    """
+    global listener
+    stop_logging()
+    if max_bytes > 0:
+        file_handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                                           backupCount=backup_count,
+                                           delay=True)
+    else:
+        file_handler = WatchedFileHandler(path, delay=True)
+    file_handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    handler = RecordQueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener = QueueListener(records, file_handler)
+    listener.start()
+    return listener
+
+
+def stop_logging():
+    """Write the queued records and stop the background writer.
+
+    The handler of ``start_logging`` is removed from the root logger.
+
+    Returns:
+        None
+    """
+    global listener
+    if listener is not None:
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if getattr(handler, "queue", None) is listener.queue:
+                root.removeHandler(handler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        listener = None
+    return None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,250 @@
+# metrics.py
+import threading
+import time
+from bisect import bisect_left
+
+# The upper bounds in seconds of the buckets of the timing histograms,
+# from 50 microseconds to 10 seconds.
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def label_text(labels):
+    """Format the labels of a metric in the Prometheus text format.
+
+    Args:
+        labels (tuple): the sorted (name, value) of the labels.
+
+    Returns:
+        string: the labels in braces, eg: '{route="/api/status"}';
+        an empty string if there is no label.
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\")
+                         .replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels) + "}"
+
+
+class Histogram:
+    """A histogram of timings with fixed buckets.
+
+    An observation only finds its bucket by a binary search and adds
+    one to it, so it's cheap enough for every request.
+
+    Attributes:
+        buckets (tuple): the upper bounds of the buckets.
+        counts (list): the number of observations of each bucket, the
+            last one for the observations above all of the bounds.
+        sum (float): the sum of the observations.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        """Add an observation.
+
+        Args:
+            value (float): the observed value.
+
+        Returns:
+            None
+        """
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+        return None
+
+    def snapshot(self):
+        """Get the counts and the sum at once.
+
+        Returns:
+            list: the number of observations of each bucket.
+            float: the sum of the observations.
+        """
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class StageTimer:
+    """Time the stages of a request one after the other.
+
+    Each mark observes the time since the previous mark, or since the
+    timer was made, as the time of the stage which just ended.
+
+    Attributes:
+        metrics (Metrics): the metrics of the stage timings.
+        route (string): the name of the request.
+        last (float): the perf_counter time of the previous mark.
+    """
+
+    def __init__(self, metrics, route):
+        self.metrics = metrics
+        self.route = route
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        """End a stage.
+
+        Args:
+            stage (string): the name of the stage.
+
+        Returns:
+            None
+        """
+        now = time.perf_counter()
+        self.metrics.observe("hr_stage_seconds", now - self.last,
+                             route=self.route, stage=stage)
+        self.last = now
+        return None
+
+
+class Metrics:
+    """Keep the counters, the gauges and the histograms of the server.
+
+    The metrics are kept in the process, and read in the Prometheus
+    text format by ``render``. A gauge is a function which is only
+    called when the metrics are read.
+
+    Attributes:
+        descriptions (dict): the (type, help) of each metric name.
+        counters (dict): the value of each (name, labels).
+        histograms (dict): the Histogram of each (name, labels).
+        gauges (dict): the function of each gauge name.
+    """
+
+    def __init__(self):
+        self.descriptions = {}
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        """Set the type and the help text of a metric.
+
+        Args:
+            name (string): the metric name.
+            kind (string): "counter", "gauge" or "histogram".
+            text (string): the help text.
+
+        Returns:
+            None
+        """
+        self.descriptions[name] = (kind, text)
+        return None
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter.
+
+        Args:
+            name (string): the metric name.
+            value (int): the number to add.
+            **labels: the labels of the counter.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        return None
+
+    def observe(self, name, value, **labels):
+        """Add an observation to a histogram.
+
+        Args:
+            name (string): the metric name.
+            value (float): the observed value.
+            **labels: the labels of the histogram.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        histogram.observe(value)
+        return None
+
+    def gauge(self, name, func):
+        """Set the function of a gauge.
+
+        Args:
+            name (string): the metric name.
+            func (callable): returns the value of the gauge.
+
+        Returns:
+            None
+        """
+        self.gauges[name] = func
+        return None
+
+    def stages(self, route):
+        """Make a timer of the stages of a request.
+
+        Args:
+            route (string): the name of the request.
+
+        Returns:
+            StageTimer: the timer, started now.
+        """
+        return StageTimer(self, route)
+
+    def render(self):
+        """Read all of the metrics in the Prometheus text format.
+
+        Returns:
+            string: the metrics.
+        """
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(),
+                                key=lambda item: item[0])
+        samples = {}
+        for (name, labels), value in counters:
+            samples.setdefault(name, []).append(
+                "{}{} {}".format(name, label_text(labels), value))
+        for (name, labels), histogram in histograms:
+            counts, total = histogram.snapshot()
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.bucket_bounds(histogram),
+                                    counts):
+                cumulative += count
+                lines.append("{}_bucket{} {}".format(
+                    name, label_text(labels + (("le", bound),)),
+                    cumulative))
+            lines.append("{}_sum{} {}".format(name, label_text(labels),
+                                              total))
+            lines.append("{}_count{} {}".format(name, label_text(labels),
+                                                cumulative))
+        for name, func in sorted(self.gauges.items()):
+            samples[name] = ["{} {}".format(name, func())]
+        text = []
+        for name in sorted(samples):
+            if name in self.descriptions:
+                kind, help_text = self.descriptions[name]
+                text.append("# HELP {} {}".format(name, help_text))
+                text.append("# TYPE {} {}".format(name, kind))
+            text.extend(samples[name])
+        return "\n".join(text) + "\n"
+
+    def bucket_bounds(self, histogram):
+        """Get the "le" labels of the buckets of a histogram.
+
+        Args:
+            histogram (Histogram): the histogram.
+
+        Returns:
+            list: the upper bounds as strings, ending with "+Inf".
+        """
+        return [repr(float(b)) for b in histogram.buckets] + ["+Inf"]
@@ -0,0 +1,638 @@
+# mongo_storage.py
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import islice
+from pymodm import connect
+from pymodm import MongoModel, fields
+from pymongo import ASCENDING, IndexModel, UpdateOne, monitoring
+from bson import Binary
+from hr_codec import encode_readings, decode_readings
+from tachycardia import classify, ages_at
+from timestamps import TIME_FORMAT, EPOCH, datetime_us, us_datetime, \
+    to_us, from_us, window_parts
+from storage import Storage, status_name, version_ages
+
+# The tries of writing a chunk of re-scored buckets, which fail when a
+# heart rate is posted to a bucket while it is re-scored.
+RESCORE_TRIES = 3
+
+
+class Patient(MongoModel):
+    patient_id = fields.IntegerField(primary_key=True)
+    attending_email = fields.EmailField()
+    patient_age = fields.FloatField()
+    latest_heart_rate = fields.IntegerField(blank=True)
+    latest_status = fields.CharField(blank=True)
+    latest_timestamp = fields.CharField(blank=True)
+    hr_count = fields.IntegerField(blank=True)
+    hr_sum = fields.IntegerField(blank=True)
+    hr_sum_sq = fields.IntegerField(blank=True)
+    hr_min = fields.IntegerField(blank=True)
+    hr_max = fields.IntegerField(blank=True)
+
+
+class PatientVersion(MongoModel):
+    patient_id = fields.IntegerField()
+    attending_email = fields.EmailField()
+    patient_age = fields.FloatField()
+    effective_from = fields.DateTimeField()
+
+    class Meta:
+        final = True
+        indexes = [IndexModel([("patient_id", ASCENDING),
+                               ("effective_from", ASCENDING)])]
+
+
+class HeartRateBucket(MongoModel):
+    bucket_id = fields.CharField(primary_key=True)
+    patient_id = fields.IntegerField()
+    bucket_start = fields.DateTimeField()
+    count = fields.IntegerField()
+    hr_sum = fields.IntegerField()
+    readings = fields.ListField()
+    packed = fields.BinaryField(blank=True)
+
+    class Meta:
+        final = True
+        indexes = [IndexModel([("patient_id", ASCENDING),
+                               ("bucket_start", ASCENDING),
+                               ("count", ASCENDING),
+                               ("hr_sum", ASCENDING)])]
+
+
+class HeartRateRollup(MongoModel):
+    rollup_id = fields.CharField(primary_key=True)
+    patient_id = fields.IntegerField()
+    count = fields.IntegerField()
+    hr_sum = fields.IntegerField()
+
+    class Meta:
+        final = True
+        indexes = [IndexModel([("patient_id", ASCENDING)])]
+
+
+def bucket_key(p_id, timestamp):
+    """Get the id and the start time of the bucket holding a reading.
+
+    The heart rate readings of each patient are grouped into one
+    bucket per hour. The bucket id is made of the patient id and the
+    "year-month-day hour" prefix of the timestamp, eg: "1:2019-11-12 13".
+
+    Args:
+        p_id (int): the patient id.
+        timestamp (string): the timestamp of the reading.
+
+    Returns:
+        string: the bucket id.
+        datetime: the start time of the bucket.
+    """
+    hour = timestamp[:13]
+    return "{}:{}".format(p_id, hour), datetime.strptime(hour, '%Y-%m-%d %H')
+
+
+def bucket_updates(p_id, readings):
+    """Build the bucket updates for the readings of one patient.
+
+    The readings are grouped by their hourly bucket, so each bucket
+    gets a single upsert which appends all of its readings at once.
+    The readings of a bucket are kept sorted by their time "t" in
+    microseconds since the epoch, and the bucket keeps the "count"
+    and the "hr_sum" of its heart rates.
+
+    Args:
+        p_id (int): the patient id.
+        readings (list): dicts with the keys of "heart_rate",
+        "status", and "timestamp".
+
+    Returns:
+        list: the pymongo UpdateOne operations of the buckets.
+    """
+    groups = {}
+    for r in readings:
+        groups.setdefault(bucket_key(p_id, r["timestamp"]), []).append(
+            {"t": to_us(r["timestamp"]),
+             "hr": r["heart_rate"],
+             "s": r["status"]})
+    ops = []
+    for (b_id, b_start), group in groups.items():
+        ops.append(UpdateOne(
+            {"_id": b_id},
+            {"$setOnInsert": {"patient_id": p_id, "bucket_start": b_start},
+             "$inc": {"count": len(group),
+                      "hr_sum": sum(r["hr"] for r in group)},
+             "$push": {"readings": {"$each": group, "$sort": {"t": 1}}}},
+            upsert=True))
+    return ops
+
+
+def snapshot_update(p_id, reading):
+    """Build the update of the latest reading snapshot of a patient.
+
+    The snapshot is only replaced when it doesn't hold a newer reading.
+
+    Args:
+        p_id (int): the patient id.
+        reading (dict): the reading with the keys of "heart_rate",
+        "status", and "timestamp".
+
+    Returns:
+        UpdateOne: the pymongo operation on the patient.
+    """
+    timestamp = from_us(to_us(reading["timestamp"]))
+    return UpdateOne(
+        {"_id": p_id,
+         "latest_timestamp": {"$not": {"$gt": timestamp}}},
+        {"$set": {"latest_heart_rate": reading["heart_rate"],
+                  "latest_status": reading["status"],
+                  "latest_timestamp": timestamp}})
+
+
+def aggregate_update(p_id, readings):
+    """Build the update of the running heart rate aggregates of a patient.
+
+    The count, the sum, the sum of squares, the minimum and the
+    maximum of all the heart rates of the patient are kept up to date
+    by the database, so the average and the variance never need the
+    history.
+
+    Args:
+        p_id (int): the patient id.
+        readings (list): the new readings with the key of "heart_rate".
+
+    Returns:
+        UpdateOne: the pymongo operation on the patient.
+    """
+    hrs = [r["heart_rate"] for r in readings]
+    return UpdateOne(
+        {"_id": p_id},
+        {"$inc": {"hr_count": len(hrs),
+                  "hr_sum": sum(hrs),
+                  "hr_sum_sq": sum(hr * hr for hr in hrs)},
+         "$min": {"hr_min": min(hrs)},
+         "$max": {"hr_max": max(hrs)}})
+
+
+def rollup_updates(p_id, readings):
+    """Build the updates of the daily, monthly and yearly heart rate totals.
+
+    Besides the hourly buckets, the "count" and "hr_sum" of the heart
+    rates of a patient are added up for each day, month and year. The
+    id of a total is the patient id and the prefix of the timestamp,
+    eg: "1:2019-11-12", "1:2019-11" and "1:2019".
+
+    Args:
+        p_id (int): the patient id.
+        readings (list): dicts with the keys of "heart_rate" and
+        "timestamp".
+
+    Returns:
+        list: the pymongo UpdateOne operations of the totals.
+    """
+    totals = {}
+    for r in readings:
+        for level in (10, 7, 4):
+            key = "{}:{}".format(p_id, r["timestamp"][:level])
+            count, hr_sum = totals.get(key, (0, 0))
+            totals[key] = (count + 1, hr_sum + r["heart_rate"])
+    return [UpdateOne({"_id": key},
+                      {"$setOnInsert": {"patient_id": p_id},
+                       "$inc": {"count": count, "hr_sum": hr_sum}},
+                      upsert=True)
+            for key, (count, hr_sum) in totals.items()]
+
+
+def bucket_readings(bucket):
+    """Get all of the readings of a bucket in time order.
+
+    A sealed bucket keeps its readings encoded in "packed", and the
+    readings which came late after it was sealed in "readings".
+
+    Args:
+        bucket (dict): the bucket with "readings" and maybe "packed".
+
+    Returns:
+        list: the readings, each with the keys of "t", "hr" and "s".
+    """
+    readings = bucket.get("readings", [])
+    if not bucket.get("packed"):
+        return readings
+    packed = decode_readings(bucket["packed"])
+    if not readings:
+        return packed
+    return sorted(packed + readings, key=lambda r: r["t"])
+
+
+def seal_buckets(p_id, before):
+    """Encode the readings of the old buckets of a patient.
+
+    The readings of each bucket which starts before the given time
+    are encoded by encode_readings into "packed", which takes a small
+    part of the space of the reading documents, and the list of
+    readings is emptied. A bucket is only sealed if no reading was
+    added to it since it was read, otherwise it is sealed the next
+    time.
+
+    Args:
+        p_id (int): the patient id.
+        before (datetime): the buckets starting before this time are
+        sealed.
+
+    Returns:
+        int: the number of sealed buckets.
+    """
+    ops = []
+    for b in HeartRateBucket.objects.raw(
+            {"patient_id": p_id, "bucket_start": {"$lt": before},
+             "readings": {"$ne": []}}) \
+            .only("count", "readings", "packed").values():
+        ops.append(UpdateOne(
+            {"_id": b["_id"], "count": b["count"]},
+            {"$set": {"packed": Binary(encode_readings(bucket_readings(b))),
+                      "readings": []}}))
+    if not ops:
+        return 0
+    result = HeartRateBucket._mongometa.collection.bulk_write(ops,
+                                                              ordered=False)
+    return result.modified_count
+
+
+def iter_buckets(p_id, start_t=None, end_t=None):
+    """Iterate over the readings of a patient one bucket at a time.
+
+    The hourly buckets are read from the database in time order by a
+    cursor, so only one batch of buckets is in memory at a time. Only
+    the buckets which overlap [start_t, end_t) are read.
+
+    Args:
+        p_id (int): the patient id.
+        start_t (int): the first time in microseconds since the epoch,
+        included; None to start from the first reading.
+        end_t (int): the last time in microseconds since the epoch,
+        excluded; None to end at the latest reading.
+
+    Yields:
+        list: the readings of a bucket inside the time range, each
+        with the keys of "t", "hr" and "s".
+    """
+    query = {"patient_id": int(p_id)}
+    if start_t is not None or end_t is not None:
+        query["bucket_start"] = {}
+    if start_t is not None:
+        first_hour = (from_us(start_t)[:13], '%Y-%m-%d %H')
+        query["bucket_start"]["$gte"] = datetime.strptime(*first_hour)
+    if end_t is not None:
+        query["bucket_start"]["$lt"] = EPOCH + timedelta(microseconds=end_t)
+    buckets = HeartRateBucket.objects.raw(query) \
+        .order_by([("bucket_start", ASCENDING)]) \
+        .only("readings", "packed").values()
+    for b in buckets:
+        readings = bucket_readings(b)
+        if start_t is not None or end_t is not None:
+            times = [r["t"] for r in readings]
+            i = 0 if start_t is None else bisect_left(times, start_t)
+            j = len(times) if end_t is None else bisect_left(times, end_t)
+            readings = readings[i:j]
+        if readings:
+            yield readings
+
+
+def bucket_totals(query):
+    """Sum the heart rate counts and sums of the matched buckets.
+
+    Only the "count" and "hr_sum" of the buckets are summed by the
+    database, which are covered by the index of the buckets.
+
+    Args:
+        query (dict): the query of the buckets.
+
+    Returns:
+        int: the number of heart rates.
+        int: the sum of heart rates.
+    """
+    result = list(HeartRateBucket._mongometa.collection.aggregate([
+        {"$match": query},
+        {"$group": {"_id": None,
+                    "count": {"$sum": "$count"},
+                    "hr_sum": {"$sum": "$hr_sum"}}}]))
+    if len(result) == 0:
+        return 0, 0
+    return result[0]["count"], result[0]["hr_sum"]
+
+
+def window_totals(p_id, start_t, end_t):
+    """Get the number and the sum of heart rates in a time window.
+
+    The whole hours of the window are added up from the totals of the
+    hourly buckets, and the whole days, months and years from their
+    totals, without reading the heart rates. Only the buckets of the
+    partial hours at the two ends of the window are read, where the
+    readings inside the window are found by binary searches.
+
+    Args:
+        p_id (int): the patient id.
+        start_t (datetime): the start of the window, included.
+        end_t (datetime): the end of the window, excluded.
+
+    Returns:
+        int: the number of heart rates.
+        int: the sum of heart rates.
+    """
+    periods, partial = window_parts(start_t, end_t)
+    hours = ["{}:{}".format(p_id, k) for k in periods if len(k) == 13]
+    others = ["{}:{}".format(p_id, k) for k in periods if len(k) < 13]
+    count = 0
+    hr_sum = 0
+    for model, ids in ((HeartRateBucket, hours), (HeartRateRollup, others)):
+        if ids:
+            for total in model.objects.raw({"_id": {"$in": ids}}) \
+                    .only("count", "hr_sum").values():
+                count += total["count"]
+                hr_sum += total["hr_sum"]
+    for t_start, t_end in partial:
+        b_id, b_start = bucket_key(p_id, t_start.strftime(TIME_FORMAT))
+        for b in HeartRateBucket.objects.raw({"_id": b_id}) \
+                .only("readings", "packed").values():
+            readings = bucket_readings(b)
+            times = [r["t"] for r in readings]
+            i = bisect_left(times, to_us(t_start.strftime(TIME_FORMAT)))
+            j = bisect_left(times, to_us(t_end.strftime(TIME_FORMAT)))
+            count += j - i
+            hr_sum += sum(r["hr"] for r in readings[i:j])
+    return count, hr_sum
+
+
+def rescore_bucket_updates(versions, buckets):
+    """Build the updates of the buckets whose statuses are stale.
+
+    The heart rates of each bucket are classified again by
+    tachycardia.classify with the age of the patient at their time.
+    A bucket is only rewritten if
+    a status changed, and only if no reading was added to it since it
+    was read; a sealed bucket is packed again with its late readings.
+
+    Args:
+        versions (list): the (effective time in microseconds, age) of
+        the versions of the patient in time order.
+        buckets (list): the buckets with "_id", "count", "readings"
+        and maybe "packed".
+
+    Returns:
+        int: the number of classified readings.
+        list: the pymongo UpdateOne operations of the changed buckets.
+        dict: the number of changed readings of each changed bucket id.
+    """
+    scored = 0
+    changed = {}
+    ops = []
+    for b in buckets:
+        readings = bucket_readings(b)
+        if not readings:
+            continue
+        tachy = classify(ages_at(versions, [r["t"] for r in readings]),
+                         [r["hr"] for r in readings])
+        new = [dict(r, s="tachycardic" if flag else "not tachycardic")
+               for r, flag in zip(readings, tachy)]
+        diff = sum(r["s"] != n["s"] for r, n in zip(readings, new))
+        scored += len(readings)
+        if diff == 0:
+            continue
+        changed[b["_id"]] = diff
+        if b.get("packed"):
+            update = {"packed": Binary(encode_readings(new)), "readings": []}
+        else:
+            update = {"readings": new}
+        ops.append(UpdateOne({"_id": b["_id"], "count": b["count"]},
+                             {"$set": update}))
+    return scored, ops, changed
+
+
+class MongoStorage(Storage):
+    """The storage of the patients and heart rates in MongoDB.
+
+    The heart rates are saved in the hourly HeartRateBucket documents
+    with the daily, monthly and yearly HeartRateRollup totals, and the
+    latest reading and the running aggregates in the Patient document.
+    The connection is made by pymodm.connect before it is used.
+    """
+
+    def add_patient(self, p_id, email, age, effective_from):
+        Patient._mongometa.collection.update_one(
+            {"_id": p_id},
+            {"$set": {"attending_email": email, "patient_age": age},
+             "$setOnInsert": {"_cls": Patient._mongometa.object_name}},
+            upsert=True)
+        PatientVersion(patient_id=p_id, attending_email=email,
+                       patient_age=age,
+                       effective_from=us_datetime(effective_from)).save()
+
+    def has_patient(self, p_id):
+        return Patient.objects.raw({"_id": p_id}).count() > 0
+
+    def patients_info(self, p_ids):
+        found = Patient.objects.raw({"_id": {"$in": list(p_ids)}}) \
+            .only("patient_age", "attending_email").values()
+        return {p["_id"]: (p["patient_age"], p["attending_email"])
+                for p in found}
+
+    def patient_ids(self):
+        return [p["_id"] for p in Patient.objects.raw({})
+                .only("patient_id").order_by([("_id", ASCENDING)]).values()]
+
+    def versions(self, p_id):
+        versions = PatientVersion.objects.raw({"patient_id": p_id}) \
+            .order_by([("effective_from", ASCENDING)]) \
+            .only("attending_email", "patient_age", "effective_from") \
+            .values()
+        return [{"attending_email": v["attending_email"],
+                 "patient_age": v["patient_age"],
+                 "effective_from": datetime_us(v["effective_from"])}
+                for v in versions]
+
+    def add_readings(self, readings_by_id):
+        """Save the heart rates of one or more patients.
+
+        All of the bucket appends are sent to the database in one bulk
+        write, all of the daily, monthly and yearly totals in another
+        one, and all of the latest reading snapshots and the running
+        aggregates of the patients in a third one. When a new bucket
+        is created, the older buckets of that patient are sealed by
+        seal_buckets.
+        """
+        bucket_ops = []
+        rollup_ops = []
+        patient_ops = []
+        for p_id, readings in readings_by_id.items():
+            bucket_ops.extend(bucket_updates(p_id, readings))
+            rollup_ops.extend(rollup_updates(p_id, readings))
+            latest = max(readings, key=lambda r: r["timestamp"])
+            patient_ops.append(snapshot_update(p_id, latest))
+            patient_ops.append(aggregate_update(p_id, readings))
+        if not bucket_ops:
+            return
+        result = HeartRateBucket._mongometa.collection.bulk_write(
+            bucket_ops, ordered=False)
+        HeartRateRollup._mongometa.collection.bulk_write(rollup_ops,
+                                                         ordered=False)
+        Patient._mongometa.collection.bulk_write(patient_ops, ordered=False)
+        for b_id in result.upserted_ids.values():
+            p_id, hour = b_id.split(":", 1)
+            b_start = datetime.strptime(hour, '%Y-%m-%d %H')
+            seal_buckets(int(p_id), b_start - timedelta(hours=1))
+
+    def latest(self, p_ids=None, after=None, limit=None):
+        query = {}
+        if p_ids is not None:
+            query["_id"] = {"$in": list(p_ids)}
+        if after is not None:
+            query = {"$and": [query, {"_id": {"$gt": after}}]}
+        found = Patient.objects.raw(query) \
+            .only("latest_heart_rate", "latest_status", "latest_timestamp") \
+            .order_by([("_id", ASCENDING)])
+        if limit is not None:
+            found = found.limit(limit)
+        return [(p["_id"], {"heart_rate": p.get("latest_heart_rate"),
+                            "status": p.get("latest_status"),
+                            "timestamp": p.get("latest_timestamp")})
+                for p in found.values()]
+
+    def aggregates(self, p_id):
+        p = Patient.objects.raw({"_id": p_id}) \
+            .only("hr_count", "hr_sum", "hr_sum_sq", "hr_min", "hr_max") \
+            .values().first()
+        if not p.get("hr_count"):
+            return None
+        return (p["hr_count"], p["hr_sum"], p["hr_sum_sq"],
+                p["hr_min"], p["hr_max"])
+
+    def iter_readings(self, p_id, start_t=None, end_t=None):
+        return iter_buckets(p_id, start_t, end_t)
+
+    def totals(self, p_id, start_t, end_t=None):
+        """Get the count and the sum of the heart rates in a time range.
+
+        A range with an end is added up by window_totals. Otherwise
+        only the bucket of the start time is read, where the later
+        readings are found by a binary search on their sorted times,
+        and the later buckets are added up from their totals.
+        """
+        if end_t is not None:
+            return window_totals(p_id, us_datetime(start_t),
+                                 us_datetime(end_t))
+        b_id, b_start = bucket_key(p_id, from_us(start_t))
+        count, hr_sum = bucket_totals({"patient_id": p_id,
+                                       "bucket_start": {"$gt": b_start}})
+        for b in HeartRateBucket.objects.raw({"_id": b_id}) \
+                .only("readings", "packed").values():
+            readings = bucket_readings(b)
+            i = bisect_left([r["t"] for r in readings], start_t)
+            count += len(readings) - i
+            hr_sum += sum(r["hr"] for r in readings[i:])
+        return count, hr_sum
+
+    def rescore(self, p_id, progress=None, chunk=100):
+        """Classify all of the stored heart rates of a patient again.
+
+        The buckets are read by a cursor and rewritten with a bulk
+        write every ``chunk`` buckets, so only one chunk is in memory.
+        A bucket changed by a post while it was scored is read and
+        scored again, and only the changes of the written buckets are
+        counted. The status of the latest reading snapshot is updated
+        too.
+
+        Raises:
+            RuntimeError: if the buckets are still changed by the posts
+            after all of the tries.
+        """
+        patient = Patient.objects.raw({"_id": p_id}) \
+            .only("patient_age", "latest_heart_rate", "latest_timestamp") \
+            .values().first()
+        versions = version_ages(self.versions(p_id), patient["patient_age"])
+        collection = HeartRateBucket._mongometa.collection
+        keys = ("count", "readings", "packed")
+        cursor = iter(HeartRateBucket.objects.raw({"patient_id": p_id})
+                      .only(*keys).values())
+        total = 0
+        while True:
+            buckets = list(islice(cursor, chunk))
+            if not buckets:
+                break
+            for attempt in range(RESCORE_TRIES):
+                scored, ops, changed = rescore_bucket_updates(versions,
+                                                              buckets)
+                if attempt == 0 and progress is not None:
+                    progress(scored, 0)
+                missed = []
+                if ops and collection.bulk_write(
+                        ops, ordered=False).matched_count < len(ops):
+                    counts = {b["_id"]: b["count"] for b in buckets}
+                    missed = [b for b in HeartRateBucket.objects
+                              .raw({"_id": {"$in": list(changed)}})
+                              .only(*keys).values()
+                              if b["count"] != counts[b["_id"]]]
+                missed_ids = set(b["_id"] for b in missed)
+                written = sum(diff for b_id, diff in changed.items()
+                              if b_id not in missed_ids)
+                total += written
+                if progress is not None and written:
+                    progress(0, written)
+                buckets = missed
+                if not buckets:
+                    break
+            if buckets:
+                raise RuntimeError(
+                    "The heart rates of patient {} kept changing while "
+                    "they were re-scored.".format(p_id))
+        if patient.get("latest_timestamp"):
+            age = ages_at(versions, [to_us(patient["latest_timestamp"])])[0]
+            status = status_name(
+                classify(age, [patient["latest_heart_rate"]])[0])
+            Patient._mongometa.collection.update_one(
+                {"_id": p_id,
+                 "latest_timestamp": patient["latest_timestamp"]},
+                {"$set": {"latest_status": status}})
+        return total
+
+
+class MongoCommandCounter(monitoring.CommandListener):
+    """Count the commands sent to MongoDB in the metrics.
+
+    Attributes:
+        metrics (Metrics): the metrics of "hr_db_commands_total".
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        return None
+
+    def succeeded(self, event):
+        self.metrics.inc("hr_db_commands_total",
+                         command=event.command_name, outcome="succeeded")
+        return None
+
+    def failed(self, event):
+        self.metrics.inc("hr_db_commands_total",
+                         command=event.command_name, outcome="failed")
+        return None
+
+
+def open_mongo(url, max_pool_size=100, min_pool_size=0, timeout_ms=5000,
+               event_listeners=()):
+    """Connect to MongoDB and open its storage.
+
+    Args:
+        url (string): the MongoDB connection string.
+        max_pool_size (int): the most connections kept open.
+        min_pool_size (int): the least connections kept open.
+        timeout_ms (int): the milliseconds to wait for a server.
+        event_listeners (list): the pymongo listeners of the commands.
+
+    Returns:
+        MongoStorage: the opened storage.
+    """
+    connect(url, maxPoolSize=max_pool_size, minPoolSize=min_pool_size,
+            connectTimeoutMS=timeout_ms,
+            serverSelectionTimeoutMS=timeout_ms,
+            event_listeners=list(event_listeners))
+    return MongoStorage()
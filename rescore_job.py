@@ -0,0 +1,171 @@
+# rescore_job.py
+import logging
+import queue
+import threading
+from shared_state import LocalState
+
+
+class RescoreJobs:
+    """Re-classify the stored heart rates of patients in the background.
+
+    A job is a list of patient ids which is scored one patient at a
+    time by a single worker thread, so a job on all of the patients
+    never loads the database more than one patient does. The progress
+    of each job is kept to be polled, and only the latest ``keep`` jobs
+    are remembered. The job ids and the progress are kept in a shared
+    state, so a job queued by one server process can be polled from
+    the others; the job itself runs in the process which queued it.
+
+    Attributes:
+        rescore (callable): re-classifies the heart rates of one
+            patient with the arguments of (p_id, progress), calls
+            progress(readings, changed) after each chunk of buckets and
+            raises an error if it fails.
+        keep (int): the number of jobs whose progress is kept.
+        state (LocalState): the last job id and the progress dict of
+            each job id.
+    """
+
+    def __init__(self, rescore, maxsize=100, keep=100, state=None):
+        self.rescore = rescore
+        self.keep = keep
+        self.queue = queue.Queue(maxsize)
+        self.state = LocalState() if state is None else state
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start the worker thread if it is not running yet.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.work,
+                                               name="rescore-worker",
+                                               daemon=True)
+                self.thread.start()
+        return None
+
+    def submit(self, p_ids):
+        """Queue a job to re-classify the heart rates of some patients.
+
+        Args:
+            p_ids (list): the patient ids.
+
+        Returns:
+            int: the job id;
+            None if the queue is full and the job is dropped.
+        """
+        self.start()
+        job_id = self.state.update("rescore:last_id",
+                                   lambda last: ((last or 0) + 1,
+                                                 (last or 0) + 1))
+        self.state.set(self.key(job_id),
+                       {"job_id": job_id, "state": "queued",
+                        "patients": len(p_ids), "patients_done": 0,
+                        "readings": 0, "changed": 0, "error": None})
+        self.state.delete(self.key(job_id - self.keep))
+        try:
+            self.queue.put_nowait((job_id, list(p_ids)))
+        except queue.Full:
+            logging.error("* Re-scoring queue is full, dropped job {}."
+                          .format(job_id))
+            self.state.delete(self.key(job_id))
+            return None
+        return job_id
+
+    def key(self, job_id):
+        """Get the key of the progress of a job in the state.
+
+        Args:
+            job_id (int): the job id.
+
+        Returns:
+            string: the key.
+        """
+        return "rescore:{}".format(job_id)
+
+    def get(self, job_id):
+        """Get the progress of a job.
+
+        Args:
+            job_id (int): the job id.
+
+        Returns:
+            dict: a copy of the progress of the job;
+            None if the job doesn't exist.
+        """
+        job = self.state.get(self.key(job_id))
+        return None if job is None else dict(job)
+
+    def set(self, job_id, **changes):
+        """Change the progress of a job.
+
+        Args:
+            job_id (int): the job id.
+            **changes: the new values of the progress.
+
+        Returns:
+            None
+        """
+        self.state.update(self.key(job_id),
+                          lambda job: (job and dict(job, **changes), None))
+        return None
+
+    def run(self, job_id, p_ids):
+        """Re-classify the heart rates of the patients of a job.
+
+        Args:
+            job_id (int): the job id.
+            p_ids (list): the patient ids.
+
+        Returns:
+            None
+        """
+        self.set(job_id, state="running")
+
+        def add(job, readings, changed):
+            return job and dict(job, readings=job["readings"] + readings,
+                                changed=job["changed"] + changed)
+
+        def progress(readings, changed):
+            self.state.update(self.key(job_id),
+                              lambda job: (add(job, readings, changed),
+                                           None))
+
+        try:
+            for i, p_id in enumerate(p_ids):
+                self.rescore(p_id, progress)
+                self.set(job_id, patients_done=i + 1)
+        except Exception as e:
+            logging.error("* Re-scoring job {} failed: {}"
+                          .format(job_id, e))
+            self.set(job_id, state="failed", error=str(e))
+        else:
+            logging.info("* Re-scoring job {} is done.".format(job_id))
+            self.set(job_id, state="done")
+        return None
+
+    def work(self):
+        """Run the queued jobs forever, used by the worker thread.
+
+        Returns:
+            None
+        """
+        while True:
+            job_id, p_ids = self.queue.get()
+            try:
+                self.run(job_id, p_ids)
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Wait until all of the queued jobs are done.
+
+        Returns:
+            None
+        """
+        self.queue.join()
+        return None
@@ -1,7 +1,105 @@
 # send_email.py
+import logging
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+
+sg_client = None
+
+
+def alert_message(to_email, alerts):
+    """Build the mail of one or more tachycardic heart rates.
+
+    Args:
+        to_email (string): the receiver's email
+        alerts (list): the (p_id, hr, time) of each tachycardic
+        heart rate, with the patient id, the heart rate and the
+        timestamp.
+
+    Returns:
+        Mail: the sendgrid mail.
+    """
+    from sendgrid.helpers.mail import Mail
+    content = ''.join('<p>'
+                      'Patient ID: {} <br />'
+                      'time: {} <br />'
+                      'heart rate: {} <br />'
+                      'Exhibits tachycardic!'
+                      '</p>'.format(p_id, time, hr)
+                      for p_id, hr, time in alerts)
+    return Mail(
+        from_email='lx66@duke.edu',
+        to_emails=to_email,
+        subject='WARNING about tachycardic heart rate',
+        html_content='<strong>{}</strong>'.format(content))
+
+
+def send_alert(to_email, alerts):
+    """Send the mail of tachycardic heart rates through Sendgrid.
+
+    The Sendgrid client is imported and created at the first mail and
+    reused afterwards, so the server starts without loading it. Unlike
+    ``email``, the errors are raised to the caller so that the mail
+    can be retried.
+
+    Args:
+        to_email (string): the receiver's email
+        alerts (list): the (p_id, hr, time) of each tachycardic
+        heart rate.
+
+    Returns:
+        int: the status code of the Sendgrid response.
+    """
+    global sg_client
+    if sg_client is None:
+        from sendgrid import SendGridAPIClient
+        sg_client = SendGridAPIClient(os.environ.get('SENDGRID_API_KEY'))
+    response = sg_client.send(alert_message(to_email, alerts))
+    if response.status_code >= 300:
+        raise IOError("Sendgrid returned {}".format(response.status_code))
+    return response.status_code
+
+
+class FakeTransport:
+    """A mail transport which keeps the mails in memory.
+
+    It can replace ``send_alert`` to run the server or the tests
+    offline. The first ``failures`` mails raise an IOError, which is
+    used to test the retries.
+
+    Attributes:
+        sent (list): the (to_email, alerts) of the sent mails.
+        failures (int): the number of mails which are going to fail.
+    """
+
+    def __init__(self, failures=0):
+        self.sent = []
+        self.failures = failures
+
+    def __call__(self, to_email, alerts):
+        if self.failures > 0:
+            self.failures -= 1
+            raise IOError("Fake transport failure")
+        self.sent.append((to_email, list(alerts)))
+        return 202
+
+
+def open_transport(name):
+    """Get the mail transport of the alert emails from its name.
+
+    Args:
+        name (string): "sendgrid" to send the mails through Sendgrid,
+        or "fake" to keep them in memory, eg: for a server run offline.
+
+    Returns:
+        callable: the transport of alert_queue.AlertQueue.
+
+    Raises:
+        ValueError: if the name is not supported.
+    """
+    if name == "sendgrid":
+        return send_alert
+    if name == "fake":
+        return FakeTransport()
+    raise ValueError("Unsupported mail transport: {}".format(name))
 
 
 def email(to_email, p_id, hr, time, send):
@@ -19,22 +117,12 @@ def email(to_email, p_id, hr, time, send):
         None
     """
     if send:
-        message = Mail(
-            from_email='lx66@duke.edu',
-            to_emails=to_email,
-            subject='WARNING about tachycardic heart rate',
-            html_content='<strong><p>'
-                         'Patient ID: {} <br />'
-                         'time: {} <br />'
-                         'heart rate: {} <br />'
-                         'Exhibits tachycardic!'
-                         '</p></strong>'.format(p_id, time, hr))
         try:
-            sg = SendGridAPIClient(os.environ.get('SENDGRID_API_KEY'))
-            response = sg.send(message)
-            print(response.status_code)
-            print(response.body)
-            print(response.headers)
+            status = send_alert(to_email, [(p_id, hr, time)])
         except Exception as e:
-            print(str(e))
+            logging.error("* Failed to send the email to {}: {}"
+                          .format(to_email, e))
+        else:
+            logging.info("* Sent the email to {}, status {}."
+                         .format(to_email, status))
     return None
@@ -0,0 +1,300 @@
+# shared_state.py
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class LocalState:
+    """Keep the shared state of the server in the process memory.
+
+    It is the state of a single server process. The values are kept as
+    they are given, so they should be json values which are replaced
+    and never changed in place, like the ones of SQLiteState.
+
+    Attributes:
+        shared (bool): False, the state is not seen by other processes.
+        clock (callable): the wall clock of the expiry times.
+        values (dict): the (value, expiry time) of each key.
+    """
+
+    shared = False
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def load(self, key):
+        """Read the value of a key while the state is locked.
+
+        Args:
+            key (string): the key.
+
+        Returns:
+            the value; None if the key is missing or expired.
+        """
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and self.clock() >= expires:
+            del self.values[key]
+            return None
+        return value
+
+    def save(self, key, value, ttl):
+        """Write the value of a key while the state is locked.
+
+        Args:
+            key (string): the key.
+            value: the json value, None to delete the key.
+            ttl (float): the seconds the value is kept.
+
+        Returns:
+            None
+        """
+        if value is None:
+            self.values.pop(key, None)
+        else:
+            expires = None if ttl is None else self.clock() + ttl
+            self.values[key] = (value, expires)
+
+    def get(self, key):
+        """Get the value of a key.
+
+        Args:
+            key (string): the key.
+
+        Returns:
+            the value; None if the key is missing or expired.
+        """
+        with self.lock:
+            return self.load(key)
+
+    def set(self, key, value, ttl=None):
+        """Set the value of a key.
+
+        Args:
+            key (string): the key.
+            value: the json value, None to delete the key.
+            ttl (float): the seconds the value is kept, None to keep it
+            until it is replaced.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.save(key, value, ttl)
+        return None
+
+    def delete(self, key):
+        """Delete a key.
+
+        Args:
+            key (string): the key.
+
+        Returns:
+            None
+        """
+        return self.set(key, None)
+
+    def update(self, key, func, ttl=None):
+        """Change the value of a key atomically.
+
+        No other update of any process runs between the read and the
+        write, so it can be used as a lock-free counter or to move a
+        state machine.
+
+        Args:
+            key (string): the key.
+            func (callable): takes the old value (None if missing) and
+            returns the new value (None to delete the key, the old one
+            to keep it as it is) and a result.
+            ttl (float): the seconds the new value is kept.
+
+        Returns:
+            the result of func.
+        """
+        with self.lock:
+            old = self.load(key)
+            value, result = func(old)
+            if value is not old:
+                self.save(key, value, ttl)
+            return result
+
+    def publish(self, data):
+        """Send an event to the other server processes.
+
+        There is no other process, so nothing is sent.
+
+        Args:
+            data: the json value of the event.
+
+        Returns:
+            None
+        """
+        return None
+
+    def events(self, after=None):
+        """Get the events sent by the other server processes.
+
+        Args:
+            after (int): the id of the last event already got, None to
+            get only the events sent from now on.
+
+        Returns:
+            int: the id of the last event.
+            list: the events after ``after``.
+        """
+        return after, []
+
+
+class SQLiteState(LocalState):
+    """Keep the shared state of the server in a SQLite file.
+
+    All of the worker processes of a server on the same machine open
+    the same file, so they see the same values, and an update is run
+    in a write transaction which locks out the other processes. The
+    events are rows of a table which is polled by the processes, and
+    only the latest ``keep_events`` events are kept.
+
+    Attributes:
+        path (string): the path of the database file.
+        origin (int): the id of this process in its events, the
+            process id if it is not given.
+        keep_events (int): the number of events kept in the table.
+    """
+
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires REAL);
+        CREATE TABLE IF NOT EXISTS event (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin INTEGER NOT NULL,
+            data TEXT NOT NULL);
+    """
+
+    def __init__(self, path, origin=None, keep_events=10000,
+                 clock=time.time):
+        super().__init__(clock)
+        self.path = path
+        self.origin = origin
+        self.keep_events = keep_events
+        self.local = threading.local()
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self):
+        """Get the connection of the current thread and process.
+
+        A connection is never used after a fork, so the workers forked
+        from the same server process each open their own.
+
+        Returns:
+            sqlite3.Connection: the connection in autocommit mode.
+        """
+        if getattr(self.local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The state is rebuilt by the server after a crash, so the
+            # commits don't wait for the disk.
+            conn.execute("PRAGMA synchronous=OFF")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return self.local.conn
+
+    def load(self, key):
+        row = self.connection().execute(
+            "SELECT value, expires FROM state WHERE key = ?",
+            (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and self.clock() >= row[1]:
+            return None
+        return json.loads(row[0])
+
+    def save(self, key, value, ttl):
+        if value is None:
+            self.connection().execute("DELETE FROM state WHERE key = ?",
+                                      (key,))
+        else:
+            expires = None if ttl is None else self.clock() + ttl
+            self.connection().execute(
+                "INSERT INTO state (key, value, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                "expires = excluded.expires",
+                (key, json.dumps(value), expires))
+
+    def get(self, key):
+        return self.load(key)
+
+    def set(self, key, value, ttl=None):
+        self.save(key, value, ttl)
+        return None
+
+    def update(self, key, func, ttl=None):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = self.load(key)
+            value, result = func(old)
+            if value is not old:
+                self.save(key, value, ttl)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def publish(self, data):
+        origin = os.getpid() if self.origin is None else self.origin
+        conn = self.connection()
+        event_id = conn.execute(
+            "INSERT INTO event (origin, data) VALUES (?, ?)",
+            (origin, json.dumps(data))).lastrowid
+        if event_id % 1000 == 0:
+            conn.execute("DELETE FROM event WHERE id <= ?",
+                         (event_id - self.keep_events,))
+        return None
+
+    def events(self, after=None):
+        conn = self.connection()
+        if after is None:
+            row = conn.execute("SELECT MAX(id) FROM event").fetchone()
+            return row[0] or 0, []
+        origin = os.getpid() if self.origin is None else self.origin
+        rows = conn.execute(
+            "SELECT id, origin, data FROM event WHERE id > ? ORDER BY id",
+            (after,)).fetchall()
+        if not rows:
+            return after, []
+        return rows[-1][0], [json.loads(row[2]) for row in rows
+                             if row[1] != origin]
+
+
+def open_state(url):
+    """Open the shared state of the server from its url.
+
+    "local" keeps it in the process, and "sqlite:<path>" shares it with
+    the other processes which open the same SQLite file.
+
+    Args:
+        url (string): the url of the shared state.
+
+    Returns:
+        LocalState: the opened state.
+
+    Raises:
+        ValueError: if the url is not supported.
+    """
+    if url == "local":
+        return LocalState()
+    if url.startswith("sqlite:"):
+        return SQLiteState(url[len("sqlite:"):])
+    raise ValueError("Unsupported shared state: {}".format(url))
@@ -0,0 +1,182 @@
+# status_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def status_etag(status):
+    """Get the ETag of a patient status.
+
+    Args:
+        status (dict): the "heart_rate", "status" and "timestamp".
+
+    Returns:
+        string: the md5 digest of the status json.
+    """
+    return hashlib.md5(json.dumps(status, sort_keys=True)
+                       .encode()).hexdigest()
+
+
+def is_older(status, cached):
+    """Check if a status is older than the cached one of the patient.
+
+    A status without any reading is older than one with a reading.
+
+    Args:
+        status (dict): the "heart_rate", "status" and "timestamp".
+        cached (dict): the cached status, None if there is none.
+
+    Returns:
+        bool: True if the cached status should be kept.
+    """
+    if cached is None or cached["timestamp"] is None:
+        return False
+    return status["timestamp"] is None or \
+        cached["timestamp"] > status["timestamp"]
+
+
+class StatusCache:
+    """A bounded LRU cache of the latest status of the patients.
+
+    Each entry holds the json of GET /api/status and its ETag. The
+    least recently used entry is dropped when the cache is full, and
+    an entry older than ``ttl`` seconds is not returned any more, so
+    a change made by another server process is seen after ``ttl``.
+
+    Attributes:
+        maxsize (int): the largest number of patients in the cache.
+        ttl (float): the seconds an entry stays valid.
+        clock (callable): the monotonic clock of the entry times.
+        entries (OrderedDict): the (status, etag, time) of each
+            patient id, the most recently used at the end.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, p_id):
+        """Get the cached status of a patient.
+
+        Args:
+            p_id (int): the patient id.
+
+        Returns:
+            tuple: the status dict and its ETag;
+            None if the patient isn't cached or the entry expired.
+        """
+        with self.lock:
+            entry = self.entries.get(p_id)
+            if entry is None:
+                return None
+            status, etag, saved = entry
+            if self.clock() - saved > self.ttl:
+                del self.entries[p_id]
+                return None
+            self.entries.move_to_end(p_id)
+            return status, etag
+
+    def put(self, p_id, status):
+        """Cache the status of a patient read from the database.
+
+        The status isn't cached if a newer one is there, which was
+        posted after the status was read.
+
+        Args:
+            p_id (int): the patient id.
+            status (dict): the "heart_rate", "status" and "timestamp".
+
+        Returns:
+            tuple: the cached status dict and its ETag.
+        """
+        return self.update(p_id, status)
+
+    def update(self, p_id, status):
+        """Replace the cached status of a patient by a newer reading.
+
+        A patient missing from the cache is added, and a cached one is
+        only replaced when the new reading isn't older than the cached
+        one, so a replayed old reading never hides the latest one.
+
+        Args:
+            p_id (int): the patient id.
+            status (dict): the "heart_rate", "status" and "timestamp".
+
+        Returns:
+            tuple: the cached status dict and its ETag.
+        """
+        with self.lock:
+            entry = self.entries.get(p_id)
+            if entry is not None and \
+                    self.clock() - entry[2] <= self.ttl and \
+                    is_older(status, entry[0]):
+                self.entries.move_to_end(p_id)
+                return entry[0], entry[1]
+            etag = status_etag(status)
+            self.entries[p_id] = (status, etag, self.clock())
+            self.entries.move_to_end(p_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return status, etag
+
+    def discard(self, p_id):
+        """Remove a patient from the cache.
+
+        Args:
+            p_id (int): the patient id.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.entries.pop(p_id, None)
+        return None
+
+
+class SharedStatusCache:
+    """A cache of the latest status of the patients in a shared state.
+
+    It has the methods of StatusCache, but the entries are kept in a
+    state shared by all of the server processes, so a heart rate posted
+    to one process updates the status returned by all of them. An
+    entry expires after ``ttl`` seconds.
+
+    Attributes:
+        state (SQLiteState): the shared state of the entries.
+        ttl (float): the seconds an entry stays valid.
+    """
+
+    def __init__(self, state, ttl=60):
+        self.state = state
+        self.ttl = ttl
+
+    def get(self, p_id):
+        """Get the shared status of a patient, see StatusCache.get."""
+        entry = self.state.get("status:{}".format(p_id))
+        return None if entry is None else tuple(entry)
+
+    def put(self, p_id, status):
+        """Share the status of a patient, see StatusCache.put."""
+        return self.update(p_id, status)
+
+    def update(self, p_id, status):
+        """Replace the shared status by a newer one, see StatusCache."""
+        etag = status_etag(status)
+
+        def replace(entry):
+            if entry is not None and is_older(status, entry[0]):
+                return entry, tuple(entry)
+            return [status, etag], (status, etag)
+
+        return self.state.update("status:{}".format(p_id), replace,
+                                 self.ttl)
+
+    def discard(self, p_id):
+        """Remove the shared status of a patient."""
+        self.state.delete("status:{}".format(p_id))
+        return None
@@ -0,0 +1,261 @@
+# status_stream.py
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from shared_state import LocalState
+
+
+def sse_event(event, data):
+    """Format a message of Server-Sent Events.
+
+    Args:
+        event (string): the event name.
+        data (dict): the event data, sent as json.
+
+    Returns:
+        string: the message of the event.
+    """
+    return "event: {}\ndata: {}\n\n".format(event, json.dumps(data))
+
+
+class Subscription:
+    """The events of a set of patients waiting for one stream client.
+
+    Attributes:
+        p_ids (set): the subscribed patient ids.
+        events (Queue): the bounded queue of (event, data) tuples.
+    """
+
+    def __init__(self, p_ids, maxsize):
+        self.p_ids = set(p_ids)
+        self.events = queue.Queue(maxsize)
+
+    def put(self, event):
+        """Put an event in the queue without waiting.
+
+        Args:
+            event (tuple): the (event, data) of the event.
+
+        Returns:
+            None
+
+        Raises:
+            queue.Full: if the client is too slow to keep up.
+        """
+        self.events.put_nowait(event)
+
+    def get(self, timeout):
+        """Wait for the next event.
+
+        Args:
+            timeout (float): the seconds to wait.
+
+        Returns:
+            tuple: the (event, data) of the event;
+            None if no event came before the timeout.
+        """
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """A subscription waited for by a coroutine instead of a thread.
+
+    The events are still put by the posting threads, which wake up
+    the event loop of the client, so a stream client only holds a
+    coroutine while it waits.
+
+    Attributes:
+        loop (AbstractEventLoop): the event loop of the client.
+        ready (asyncio.Event): set when an event may be waiting.
+    """
+
+    def __init__(self, p_ids, maxsize, loop):
+        super().__init__(p_ids, maxsize)
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def put(self, event):
+        super().put(event)
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # The loop is closed, the client is going to unsubscribe.
+            pass
+
+    async def wait(self, timeout):
+        """Wait for the next event in the event loop.
+
+        Args:
+            timeout (float): the seconds to wait.
+
+        Returns:
+            tuple: the (event, data) of the event;
+            None if no event came before the timeout.
+        """
+        self.ready.clear()
+        try:
+            return self.events.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        try:
+            return self.events.get_nowait()
+        except queue.Empty:
+            return None
+
+
+class StatusBroker:
+    """Send the posted heart rates to the clients subscribed to them.
+
+    The server publishes each heart rate and each tachycardia
+    transition once, and the broker puts it only in the queues of the
+    subscriptions of that patient. A client which doesn't read its
+    events fast enough loses the new ones instead of slowing down the
+    posts.
+
+    The events are also sent through a shared state to the brokers of
+    the other server processes, which follow them once they have a
+    subscription, so a stream gets the heart rates posted to any
+    process.
+
+    Attributes:
+        maxsize (int): the size of the event queue of a subscription.
+        subscribers (dict): the set of subscriptions of each patient id.
+        state (LocalState): the state which carries the events between
+            the server processes.
+        interval (float): the seconds between two polls of the events
+            of the other processes.
+    """
+
+    def __init__(self, maxsize=100, state=None, interval=0.2):
+        self.maxsize = maxsize
+        self.subscribers = {}
+        self.state = LocalState() if state is None else state
+        self.interval = interval
+        self.follower = None
+        self.lock = threading.Lock()
+
+    def subscribe(self, p_ids, loop=None):
+        """Subscribe to the events of some patients.
+
+        Args:
+            p_ids (list): the patient ids.
+            loop (AbstractEventLoop): the event loop of an asyncio
+            client, None for a client thread.
+
+        Returns:
+            Subscription: the new subscription, an AsyncSubscription
+            if the loop is given.
+        """
+        if loop is None:
+            sub = Subscription(p_ids, self.maxsize)
+        else:
+            sub = AsyncSubscription(p_ids, self.maxsize, loop)
+        with self.lock:
+            for p_id in sub.p_ids:
+                self.subscribers.setdefault(p_id, set()).add(sub)
+            if self.state.shared and self.follower is None:
+                self.follower = threading.Thread(target=self.follow,
+                                                 name="status-follower",
+                                                 daemon=True)
+                self.follower.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        """Remove a subscription.
+
+        Args:
+            sub (Subscription): the subscription.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            for p_id in sub.p_ids:
+                subs = self.subscribers.get(p_id)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self.subscribers[p_id]
+        return None
+
+    def count(self):
+        """Count the subscriptions.
+
+        Returns:
+            int: the number of subscriptions of this process.
+        """
+        with self.lock:
+            return len({sub for subs in self.subscribers.values()
+                        for sub in subs})
+
+    def publish(self, p_id, event, data):
+        """Send an event of a patient to its subscriptions.
+
+        The event is sent to the other server processes too.
+
+        Args:
+            p_id (int): the patient id.
+            event (string): the event name.
+            data (dict): the event data.
+
+        Returns:
+            int: the number of subscriptions of this process which got
+            the event.
+        """
+        self.state.publish([p_id, event, data])
+        return self.deliver(p_id, event, data)
+
+    def follow(self):
+        """Deliver the events of the other processes forever.
+
+        It is run by the follower thread, which polls the shared state
+        every ``interval`` seconds.
+
+        Returns:
+            None
+        """
+        after = None
+        while True:
+            try:
+                after, events = self.state.events(after)
+            except Exception as e:
+                logging.error("* Failed to read the stream events: {}"
+                              .format(e))
+                events = []
+            for p_id, event, data in events:
+                self.deliver(p_id, event, data)
+            time.sleep(self.interval)
+
+    def deliver(self, p_id, event, data):
+        """Put an event of a patient in the queues of its subscriptions.
+
+        Args:
+            p_id (int): the patient id.
+            event (string): the event name.
+            data (dict): the event data.
+
+        Returns:
+            int: the number of subscriptions which got the event.
+        """
+        with self.lock:
+            subs = list(self.subscribers.get(p_id, ()))
+        sent = 0
+        for sub in subs:
+            try:
+                sub.put((event, data))
+            except queue.Full:
+                logging.warning("* Dropped a stream event of ID {}."
+                                .format(p_id))
+            else:
+                sent += 1
+        return sent
@@ -0,0 +1,801 @@
+# storage.py
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from hr_codec import TACHYCARDIC, NOT_TACHYCARDIC
+from tachycardia import classify, ages_at
+from timestamps import to_us, from_us, datetime_us, us_datetime, \
+    window_parts
+
+CHUNK = 1000
+
+
+def empty_status():
+    """Get the status of a patient without any heart rate.
+
+    Returns:
+        dict: the "heart_rate", "status" and "timestamp", all None.
+    """
+    return {"heart_rate": None, "status": None, "timestamp": None}
+
+
+def status_name(tachycardic):
+    """Get the status string of a tachycardic flag.
+
+    Args:
+        tachycardic (bool): True if the heart rate is tachycardic.
+
+    Returns:
+        string: "tachycardic" or "not tachycardic".
+    """
+    return TACHYCARDIC if tachycardic else NOT_TACHYCARDIC
+
+
+def version_ages(versions, age):
+    """Get the (effective time, age) of the versions of a patient.
+
+    Args:
+        versions (list): the versions of Storage.versions.
+        age (float): the current age, used if there is no version.
+
+    Returns:
+        list: the (effective time in microseconds, age) in time order.
+    """
+    if not versions:
+        return [(0, age)]
+    return [(v["effective_from"], v["patient_age"]) for v in versions]
+
+
+class Storage(ABC):
+    """The interface of the patient and heart rate storage of the server.
+
+    The route handlers of hr_server only go through these methods, so
+    the same server runs on MongoDB, in memory or on SQLite. A reading
+    is posted as a dict of "heart_rate", "status" and "timestamp", and
+    read back as a dict of "t" (microseconds since the epoch), "hr"
+    and "s". A backend which misses one of the methods can't be made.
+    """
+
+    @abstractmethod
+    def add_patient(self, p_id, email, age, effective_from):
+        """Register a patient or update its email and age.
+
+        The stored heart rates are kept, and a version of the patient
+        is saved which is effective from the given time.
+
+        Args:
+            p_id (int): the patient id.
+            email (string): the attending email.
+            age (float): the patient age.
+            effective_from (int): the time of the registration in
+            microseconds since the epoch.
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def has_patient(self, p_id):
+        """Check if a patient is registered.
+
+        Args:
+            p_id (int): the patient id.
+
+        Returns:
+            bool: True if the patient is registered.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def patients_info(self, p_ids):
+        """Get the age and the email of some patients.
+
+        Args:
+            p_ids (iterable): the patient ids.
+
+        Returns:
+            dict: the (age, email) of each registered patient id.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def patient_ids(self):
+        """Get the ids of all of the patients.
+
+        Returns:
+            list: the patient ids in order.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def versions(self, p_id):
+        """Get the registered versions of a patient in time order.
+
+        Args:
+            p_id (int): the patient id.
+
+        Returns:
+            list: the versions, each with "attending_email",
+            "patient_age" and "effective_from" in microseconds.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_readings(self, readings_by_id):
+        """Save the heart rates of one or more patients.
+
+        The latest reading, the count, the sum, the sum of squares,
+        the minimum and the maximum of each patient are updated too.
+
+        Args:
+            readings_by_id (dict): the lists of readings keyed by the
+            patient id, each with "heart_rate", "status" and
+            "timestamp".
+
+        Returns:
+            None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest(self, p_ids=None, after=None, limit=None):
+        """Get the latest status of some patients in the order of id.
+
+        Args:
+            p_ids (iterable): the patient ids, None for all patients.
+            after (int): only the ids after this one.
+            limit (int): the largest number of patients.
+
+        Returns:
+            list: the (p_id, status) of each registered patient, where
+            status has "heart_rate", "status" and "timestamp", all
+            None if the patient has no heart rate.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def aggregates(self, p_id):
+        """Get the running aggregates of the heart rates of a patient.
+
+        Args:
+            p_id (int): the patient id.
+
+        Returns:
+            tuple: the count, sum, sum of squares, minimum and maximum;
+            None if the patient has no heart rate.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_readings(self, p_id, start_t=None, end_t=None):
+        """Iterate over the readings of a patient in time order.
+
+        Args:
+            p_id (int): the patient id.
+            start_t (int): the first time in microseconds, included;
+            None to start from the first reading.
+            end_t (int): the last time in microseconds, excluded;
+            None to end at the latest reading.
+
+        Returns:
+            iterator: the lists of readings, each with "t", "hr" and
+            "s", one chunk at a time.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def totals(self, p_id, start_t, end_t=None):
+        """Get the count and the sum of the heart rates in a time range.
+
+        Args:
+            p_id (int): the patient id.
+            start_t (int): the first time in microseconds, included.
+            end_t (int): the last time in microseconds, excluded;
+            None to end at the latest reading.
+
+        Returns:
+            int: the number of heart rates.
+            int: the sum of heart rates.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def rescore(self, p_id, progress=None, chunk=100):
+        """Classify all of the stored heart rates of a patient again.
+
+        Each heart rate is classified with the age of its time in the
+        versions of the patient, and so is the latest reading.
+
+        Args:
+            p_id (int): the patient id.
+            progress (callable): called with the numbers of the
+            classified and of the changed readings after each chunk.
+            chunk (int): the size of a chunk.
+
+        Returns:
+            int: the number of changed readings.
+        """
+        raise NotImplementedError
+
+
+class MemoryStorage(Storage):
+    """Keep the patients and their heart rates in the process memory.
+
+    It is used by the tests and the benchmarks, and by a single
+    server process which doesn't need to keep its data. The readings
+    of each patient are kept in time order in three lists of the
+    times, the heart rates and the statuses, with a running list of
+    the sums of the heart rates before each reading, so the total of
+    any time range is found by two binary searches.
+
+    Attributes:
+        patients (dict): the record of each patient id.
+    """
+
+    def __init__(self):
+        self.patients = {}
+        self.lock = threading.RLock()
+
+    def add_patient(self, p_id, email, age, effective_from):
+        with self.lock:
+            p = self.patients.setdefault(p_id, {
+                "versions": [], "t": [], "hr": [], "s": [], "sums": [0],
+                "latest": None, "aggregates": None})
+            p["attending_email"] = email
+            p["patient_age"] = age
+            p["versions"].append({"attending_email": email,
+                                  "patient_age": age,
+                                  "effective_from": effective_from})
+        return None
+
+    def has_patient(self, p_id):
+        return p_id in self.patients
+
+    def patients_info(self, p_ids):
+        with self.lock:
+            return {p_id: (self.patients[p_id]["patient_age"],
+                           self.patients[p_id]["attending_email"])
+                    for p_id in p_ids if p_id in self.patients}
+
+    def patient_ids(self):
+        with self.lock:
+            return sorted(self.patients)
+
+    def versions(self, p_id):
+        with self.lock:
+            return [dict(v) for v in self.patients[p_id]["versions"]]
+
+    def add_readings(self, readings_by_id):
+        with self.lock:
+            for p_id, readings in readings_by_id.items():
+                p = self.patients[p_id]
+                for r in readings:
+                    t = to_us(r["timestamp"])
+                    i = bisect_right(p["t"], t)
+                    p["t"].insert(i, t)
+                    p["hr"].insert(i, r["heart_rate"])
+                    p["s"].insert(i, r["status"])
+                    sums = p["sums"]
+                    hr = r["heart_rate"]
+                    if i == len(sums) - 1:
+                        sums.append(sums[-1] + hr)
+                    else:
+                        sums.insert(i + 1, sums[i] + hr)
+                        for k in range(i + 2, len(sums)):
+                            sums[k] += hr
+                    timestamp = from_us(t)
+                    latest = p["latest"]
+                    if latest is None or latest["timestamp"] <= timestamp:
+                        p["latest"] = {"heart_rate": r["heart_rate"],
+                                       "status": r["status"],
+                                       "timestamp": timestamp}
+                hrs = [r["heart_rate"] for r in readings]
+                agg = p["aggregates"] or (0, 0, 0, min(hrs), max(hrs))
+                p["aggregates"] = (agg[0] + len(hrs), agg[1] + sum(hrs),
+                                   agg[2] + sum(hr * hr for hr in hrs),
+                                   min(agg[3], min(hrs)),
+                                   max(agg[4], max(hrs)))
+        return None
+
+    def latest(self, p_ids=None, after=None, limit=None):
+        with self.lock:
+            ids = self.patients if p_ids is None else \
+                set(p_ids) & set(self.patients)
+            ids = sorted(p_id for p_id in ids
+                         if after is None or p_id > after)[:limit]
+            return [(p_id, dict(self.patients[p_id]["latest"] or
+                                empty_status()))
+                    for p_id in ids]
+
+    def aggregates(self, p_id):
+        with self.lock:
+            return self.patients[p_id]["aggregates"]
+
+    def iter_readings(self, p_id, start_t=None, end_t=None):
+        with self.lock:
+            p = self.patients[p_id]
+            i = 0 if start_t is None else bisect_left(p["t"], start_t)
+            j = len(p["t"]) if end_t is None else \
+                bisect_left(p["t"], end_t)
+            times = p["t"][i:j]
+            hrs = p["hr"][i:j]
+            statuses = p["s"][i:j]
+        for k in range(0, len(times), CHUNK):
+            yield [{"t": t, "hr": hr, "s": s} for t, hr, s in
+                   zip(times[k:k + CHUNK], hrs[k:k + CHUNK],
+                       statuses[k:k + CHUNK])]
+
+    def totals(self, p_id, start_t, end_t=None):
+        with self.lock:
+            p = self.patients[p_id]
+            i = bisect_left(p["t"], start_t)
+            j = len(p["t"]) if end_t is None else \
+                bisect_left(p["t"], end_t)
+            return j - i, p["sums"][j] - p["sums"][i]
+
+    def rescore(self, p_id, progress=None, chunk=100):
+        # The lock is only held for a chunk at a time, so the posts of
+        # all of the patients go on while a long history is re-scored.
+        # A chunk ends after all of the readings of its last time, and
+        # the next one starts after that time, so a reading added in
+        # between doesn't move the chunks.
+        with self.lock:
+            p = self.patients[p_id]
+            versions = version_ages(p["versions"], p["patient_age"])
+        changed = 0
+        last = None
+        while True:
+            with self.lock:
+                i = 0 if last is None else bisect_right(p["t"], last)
+                if i >= len(p["t"]):
+                    break
+                j = bisect_right(p["t"], p["t"][min(i + chunk,
+                                                    len(p["t"])) - 1])
+                flags = classify(ages_at(versions, p["t"][i:j]),
+                                 p["hr"][i:j])
+                diff = 0
+                for k, flag in enumerate(flags, i):
+                    if p["s"][k] != status_name(flag):
+                        p["s"][k] = status_name(flag)
+                        diff += 1
+                last = p["t"][j - 1]
+            changed += diff
+            if progress is not None:
+                progress(j - i, diff)
+        with self.lock:
+            latest = p["latest"]
+            if latest is not None:
+                age = ages_at(versions, [to_us(latest["timestamp"])])[0]
+                latest["status"] = status_name(
+                    classify(age, [latest["heart_rate"]])[0])
+        return changed
+
+
+class SQLiteStorage(Storage):
+    """Keep the patients and their heart rates in a SQLite database.
+
+    The readings are rows of (patient_id, t, hr, tachycardic) with an
+    index on (patient_id, t), so the time ranges of a patient are read
+    by the index. The count and the sum of the heart rates of each
+    hour, day, month and year of a patient are kept in reading_total,
+    like the buckets and the rollups of MongoStorage, so the totals of
+    a time range only read the readings of its two partial hours. Each
+    thread uses its own connection to the file.
+
+    Attributes:
+        path (string): the path of the database file.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS patient (
+            patient_id INTEGER PRIMARY KEY,
+            attending_email TEXT,
+            patient_age REAL,
+            latest_heart_rate INTEGER,
+            latest_status TEXT,
+            latest_timestamp TEXT,
+            hr_count INTEGER NOT NULL DEFAULT 0,
+            hr_sum INTEGER NOT NULL DEFAULT 0,
+            hr_sum_sq INTEGER NOT NULL DEFAULT 0,
+            hr_min INTEGER,
+            hr_max INTEGER);
+        CREATE TABLE IF NOT EXISTS patient_version (
+            patient_id INTEGER NOT NULL,
+            effective_from INTEGER NOT NULL,
+            attending_email TEXT,
+            patient_age REAL);
+        CREATE INDEX IF NOT EXISTS patient_version_time
+            ON patient_version (patient_id, effective_from);
+        CREATE TABLE IF NOT EXISTS reading (
+            patient_id INTEGER NOT NULL,
+            t INTEGER NOT NULL,
+            hr INTEGER NOT NULL,
+            tachycardic INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS reading_time
+            ON reading (patient_id, t);
+        CREATE TABLE IF NOT EXISTS reading_total (
+            patient_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            hr_sum INTEGER NOT NULL,
+            PRIMARY KEY (patient_id, period));
+    """
+
+    # The periods of reading_total, as formats of the timestamp prefix.
+    PERIODS = ("%Y-%m-%d %H", "%Y-%m-%d", "%Y-%m", "%Y")
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(self.SCHEMA)
+            if conn.execute("SELECT 1 FROM reading_total LIMIT 1") \
+                    .fetchone() is None:
+                # Add up the readings saved before the totals were kept.
+                for period in self.PERIODS:
+                    conn.execute(
+                        "INSERT INTO reading_total SELECT patient_id, "
+                        "strftime(?, t / 1000000, 'unixepoch'), COUNT(*), "
+                        "SUM(hr) FROM reading GROUP BY 1, 2", (period,))
+
+    def connection(self):
+        """Get the connection of the current thread and process.
+
+        Returns:
+            sqlite3.Connection: the connection.
+        """
+        if getattr(self.local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return self.local.conn
+
+    def add_patient(self, p_id, email, age, effective_from):
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT INTO patient (patient_id, attending_email, "
+                "patient_age) VALUES (?, ?, ?) ON CONFLICT (patient_id) "
+                "DO UPDATE SET attending_email = excluded.attending_email, "
+                "patient_age = excluded.patient_age", (p_id, email, age))
+            conn.execute("INSERT INTO patient_version VALUES (?, ?, ?, ?)",
+                         (p_id, effective_from, email, age))
+        return None
+
+    def has_patient(self, p_id):
+        row = self.connection().execute(
+            "SELECT 1 FROM patient WHERE patient_id = ?", (p_id,)).fetchone()
+        return row is not None
+
+    def patients_info(self, p_ids):
+        p_ids = list(p_ids)
+        info = {}
+        for k in range(0, len(p_ids), 500):
+            part = p_ids[k:k + 500]
+            rows = self.connection().execute(
+                "SELECT patient_id, patient_age, attending_email "
+                "FROM patient WHERE patient_id IN ({})"
+                .format(", ".join("?" * len(part))), part)
+            for p_id, age, email in rows:
+                info[p_id] = (age, email)
+        return info
+
+    def patient_ids(self):
+        rows = self.connection().execute(
+            "SELECT patient_id FROM patient ORDER BY patient_id")
+        return [row[0] for row in rows]
+
+    def versions(self, p_id):
+        rows = self.connection().execute(
+            "SELECT attending_email, patient_age, effective_from "
+            "FROM patient_version WHERE patient_id = ? "
+            "ORDER BY effective_from", (p_id,))
+        return [{"attending_email": email, "patient_age": age,
+                 "effective_from": t} for email, age, t in rows]
+
+    def add_readings(self, readings_by_id):
+        with self.connection() as conn:
+            for p_id, readings in readings_by_id.items():
+                conn.executemany(
+                    "INSERT INTO reading VALUES (?, ?, ?, ?)",
+                    [(p_id, to_us(r["timestamp"]), r["heart_rate"],
+                      r["status"] == TACHYCARDIC) for r in readings])
+                totals = {}
+                for r in readings:
+                    timestamp = from_us(to_us(r["timestamp"]))
+                    for level in (13, 10, 7, 4):
+                        count, hr_sum = totals.get(timestamp[:level], (0, 0))
+                        totals[timestamp[:level]] = (count + 1,
+                                                     hr_sum + r["heart_rate"])
+                conn.executemany(
+                    "INSERT INTO reading_total VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (patient_id, period) DO UPDATE SET "
+                    "count = count + excluded.count, "
+                    "hr_sum = hr_sum + excluded.hr_sum",
+                    [(p_id, period, count, hr_sum)
+                     for period, (count, hr_sum) in totals.items()])
+                hrs = [r["heart_rate"] for r in readings]
+                conn.execute(
+                    "UPDATE patient SET hr_count = hr_count + ?, "
+                    "hr_sum = hr_sum + ?, hr_sum_sq = hr_sum_sq + ?, "
+                    "hr_min = MIN(COALESCE(hr_min, ?), ?), "
+                    "hr_max = MAX(COALESCE(hr_max, ?), ?) "
+                    "WHERE patient_id = ?",
+                    (len(hrs), sum(hrs), sum(hr * hr for hr in hrs),
+                     min(hrs), min(hrs), max(hrs), max(hrs), p_id))
+                latest = max(readings, key=lambda r: r["timestamp"])
+                timestamp = from_us(to_us(latest["timestamp"]))
+                conn.execute(
+                    "UPDATE patient SET latest_heart_rate = ?, "
+                    "latest_status = ?, latest_timestamp = ? "
+                    "WHERE patient_id = ? AND (latest_timestamp IS NULL "
+                    "OR latest_timestamp <= ?)",
+                    (latest["heart_rate"], latest["status"], timestamp,
+                     p_id, timestamp))
+        return None
+
+    def latest(self, p_ids=None, after=None, limit=None):
+        where = []
+        args = []
+        if p_ids is not None:
+            p_ids = list(p_ids)
+            where.append("patient_id IN ({})"
+                         .format(", ".join("?" * len(p_ids))))
+            args.extend(p_ids)
+        if after is not None:
+            where.append("patient_id > ?")
+            args.append(after)
+        sql = "SELECT patient_id, latest_heart_rate, latest_status, " \
+              "latest_timestamp FROM patient"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY patient_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [(p_id, {"heart_rate": hr, "status": status,
+                        "timestamp": timestamp})
+                for p_id, hr, status, timestamp in
+                self.connection().execute(sql, args)]
+
+    def aggregates(self, p_id):
+        row = self.connection().execute(
+            "SELECT hr_count, hr_sum, hr_sum_sq, hr_min, hr_max "
+            "FROM patient WHERE patient_id = ?", (p_id,)).fetchone()
+        if row is None or row[0] == 0:
+            return None
+        return row
+
+    def iter_readings(self, p_id, start_t=None, end_t=None):
+        sql = "SELECT t, hr, tachycardic FROM reading WHERE patient_id = ?"
+        args = [p_id]
+        if start_t is not None:
+            sql += " AND t >= ?"
+            args.append(start_t)
+        if end_t is not None:
+            sql += " AND t < ?"
+            args.append(end_t)
+        cursor = self.connection().execute(sql + " ORDER BY t, rowid",
+                                           args)
+        while True:
+            rows = cursor.fetchmany(CHUNK)
+            if not rows:
+                return
+            yield [{"t": t, "hr": hr, "s": status_name(tachy)}
+                   for t, hr, tachy in rows]
+
+    def totals(self, p_id, start_t, end_t=None):
+        """Get the count and the sum of the heart rates in a time range.
+
+        The range is split by timestamps.window_parts: its whole hours,
+        days, months and years are added up from reading_total, and
+        only the readings of the partial hours at its two ends are
+        read. A range without an end ends after the latest reading.
+        """
+        conn = self.connection()
+        if end_t is None:
+            latest = conn.execute(
+                "SELECT MAX(t) FROM reading WHERE patient_id = ?",
+                (p_id,)).fetchone()[0]
+            if latest is None or latest < start_t:
+                return 0, 0
+            end_t = latest + 1
+        periods, partial = window_parts(us_datetime(start_t),
+                                        us_datetime(end_t))
+        count = 0
+        hr_sum = 0
+        for k in range(0, len(periods), 500):
+            part = periods[k:k + 500]
+            row = conn.execute(
+                "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(hr_sum), 0) "
+                "FROM reading_total WHERE patient_id = ? AND period IN ({})"
+                .format(", ".join("?" * len(part))), [p_id] + part) \
+                .fetchone()
+            count += row[0]
+            hr_sum += row[1]
+        for t_start, t_end in partial:
+            row = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hr), 0) FROM reading "
+                "WHERE patient_id = ? AND t >= ? AND t < ?",
+                (p_id, datetime_us(t_start), datetime_us(t_end))).fetchone()
+            count += row[0]
+            hr_sum += row[1]
+        return count, hr_sum
+
+    def rescore(self, p_id, progress=None, chunk=100):
+        conn = self.connection()
+        age, latest_hr, latest_timestamp = conn.execute(
+            "SELECT patient_age, latest_heart_rate, latest_timestamp "
+            "FROM patient WHERE patient_id = ?", (p_id,)).fetchone()
+        versions = version_ages(self.versions(p_id), age)
+        changed = 0
+        last = (-1, -1)
+        while True:
+            rows = conn.execute(
+                "SELECT rowid, t, hr, tachycardic FROM reading "
+                "WHERE patient_id = ? AND (t > ? OR (t = ? AND rowid > ?)) "
+                "ORDER BY t, rowid LIMIT ?",
+                (p_id, last[0], last[0], last[1], chunk)).fetchall()
+            if not rows:
+                break
+            flags = classify(ages_at(versions, [r[1] for r in rows]),
+                             [r[2] for r in rows])
+            updates = [(int(flag), row[0]) for row, flag in zip(rows, flags)
+                       if bool(row[3]) != bool(flag)]
+            with conn:
+                conn.executemany(
+                    "UPDATE reading SET tachycardic = ? WHERE rowid = ?",
+                    updates)
+            changed += len(updates)
+            if progress is not None:
+                progress(len(rows), len(updates))
+            last = (rows[-1][1], rows[-1][0])
+        if latest_timestamp is not None:
+            age = ages_at(versions, [to_us(latest_timestamp)])[0]
+            with conn:
+                conn.execute(
+                    "UPDATE patient SET latest_status = ? "
+                    "WHERE patient_id = ? AND latest_timestamp = ?",
+                    (status_name(classify(age, [latest_hr])[0]), p_id,
+                     latest_timestamp))
+        return changed
+
+
+class LazyStorage:
+    """Open a storage when it is used for the first time.
+
+    It has all of the methods of the storage which it opens, so the
+    server can be created without connecting to the database, eg:
+    without the DNS lookup and the server selection of MongoDB.
+
+    Attributes:
+        opener (callable): opens the storage, without arguments.
+        storage (Storage): the opened storage, None until it is used.
+    """
+
+    def __init__(self, opener):
+        self.opener = opener
+        self.storage = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.opened(), name)
+
+    def opened(self):
+        """Get the storage, which is opened if it isn't yet.
+
+        Returns:
+            Storage: the opened storage.
+        """
+        if self.storage is None:
+            with self.lock:
+                if self.storage is None:
+                    self.storage = self.opener()
+        return self.storage
+
+
+class MeteredStorage:
+    """Time each call of a storage.
+
+    It has all of the methods of the storage which it wraps, and the
+    seconds of each call are given to ``observe`` with the method
+    name. The readings of ``iter_readings`` are fetched while they are
+    iterated, so the time of each chunk is observed as one call.
+
+    Attributes:
+        storage (Storage): the wrapped storage.
+        observe (callable): takes the method name and the seconds.
+    """
+
+    def __init__(self, storage, observe):
+        self.storage = storage
+        self.observe = observe
+
+    def __getattr__(self, name):
+        attr = getattr(self.storage, name)
+        if not callable(attr):
+            return attr
+        if name == "iter_readings":
+            return lambda *args, **kwargs: self.iterate(
+                name, attr(*args, **kwargs))
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start)
+
+        return timed
+
+    def iterate(self, name, chunks):
+        """Time each step of an iterator.
+
+        Args:
+            name (string): the method name of the iterator.
+            chunks (iterator): the iterator.
+
+        Yields:
+            the items of the iterator.
+        """
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                self.observe(name, time.perf_counter() - start)
+            yield item
+
+
+def is_mongo_url(url):
+    """Check if the url of a storage is a MongoDB connection string.
+
+    Args:
+        url (string): the url of the storage.
+
+    Returns:
+        bool: False for "memory" and "sqlite:<path>", True otherwise.
+    """
+    return url != "memory" and not url.startswith("sqlite:")
+
+
+def open_storage(url, max_pool_size=100, min_pool_size=0, timeout_ms=5000,
+                 event_listeners=()):
+    """Open the storage of the server from its url.
+
+    "memory" keeps everything in the process, "sqlite:<path>" opens an
+    SQLite database file, and any other url is a MongoDB connection
+    string. MongoDB is only connected when the storage is used for
+    the first time, so the server starts without waiting for the DNS
+    lookup of the url and for the servers, and mongo_storage is only
+    imported then.
+
+    Args:
+        url (string): the url of the storage.
+        max_pool_size (int): the most MongoDB connections kept open.
+        min_pool_size (int): the least MongoDB connections kept open.
+        timeout_ms (int): the milliseconds to wait for a MongoDB server.
+        event_listeners (list): the pymongo listeners of the MongoDB
+        commands.
+
+    Returns:
+        Storage: the opened storage.
+    """
+    if url == "memory":
+        return MemoryStorage()
+    if not is_mongo_url(url):
+        return SQLiteStorage(url[len("sqlite:"):])
+
+    def opener():
+        from mongo_storage import open_mongo
+        return open_mongo(url, max_pool_size, min_pool_size, timeout_ms,
+                          event_listeners)
+
+    return LazyStorage(opener)
@@ -0,0 +1,73 @@
+# tachycardia.py
+import math
+from bisect import bisect_right
+import numpy as np
+
+# The highest heart rate which is not tachycardic, indexed by the age
+# in whole years; the last one is used for all of the older ages. There
+# is no rule for the babies under 1 year, so all of their heart rates
+# are tachycardic and get the attention of the doctor.
+HR_LIMITS = (-1, 151, 151, 137, 137, 133, 133, 133,
+             130, 130, 130, 130, 119, 119, 119, 119, 100)
+HR_LIMIT_ARRAY = np.array(HR_LIMITS, dtype=np.int64)
+
+
+def age_index(age):
+    """Get the index of an age in HR_LIMITS.
+
+    The age is counted in whole years, so a 2.5 years old patient has
+    the limit of a 2 years old one.
+
+    Args:
+        age (float): the patient age in years.
+
+    Returns:
+        int: the index in HR_LIMITS.
+    """
+    return min(max(math.floor(age), 0), len(HR_LIMITS) - 1)
+
+
+def hr_limit(age):
+    """Get the highest heart rate which is not tachycardic for an age.
+
+    Args:
+        age (float): the patient age in years.
+
+    Returns:
+        int: the highest heart rate which is not tachycardic.
+    """
+    return HR_LIMITS[age_index(age)]
+
+
+def classify(ages, hrs):
+    """Check if many heart rates are tachycardic at once.
+
+    Args:
+        ages (array_like): the patient ages in years, or a single age
+        for all of the heart rates.
+        hrs (array_like): the heart rates.
+
+    Returns:
+        numpy.ndarray: True for each tachycardic heart rate.
+    """
+    index = np.clip(np.floor(np.asarray(ages, dtype=np.float64)),
+                    0, len(HR_LIMITS) - 1).astype(np.intp)
+    return np.asarray(hrs) > HR_LIMIT_ARRAY[index]
+
+
+def ages_at(versions, times):
+    """Get the age of a patient at the time of each reading.
+
+    A reading before the first version gets the age of the first one.
+
+    Args:
+        versions (list): the (effective time in microseconds, age) of
+        the versions of the patient in time order.
+        times (list): the reading times in microseconds.
+
+    Returns:
+        list: the age of each reading.
+    """
+    starts = [v[0] for v in versions]
+    return [versions[max(bisect_right(starts, t) - 1, 0)][1]
+            for t in times]
@@ -0,0 +1,69 @@
+# test_alert_queue.py
+import pytest
+
+
+@pytest.mark.parametrize("failures, retries, expected", [
+    (0, 3, 1),
+    (2, 3, 1),
+    (4, 3, 0)
+])
+def test_alert_queue_send(failures, retries, expected, caplog):
+    """Test the retries of the alert queue with the fake transport.
+
+    Args:
+        failures (int): the number of mails which fail.
+        retries (int): the number of retries of the queue.
+        expected (int): the expected number of sent mails.
+        caplog: the pytest log capture.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from alert_queue import AlertQueue
+    from send_email import FakeTransport
+    caplog.set_level("INFO")
+    transport = FakeTransport(failures)
+    q = AlertQueue(transport, retries=retries, backoff=0)
+    assert q.put("dr@yourdomain.com", [(1, 160, "2019-11-12 13:05:35.00")])
+    q.join()
+    assert len(transport.sent) == expected
+    sent = [r for r in caplog.records if r.getMessage() ==
+            "* Sent the email to dr@yourdomain.com, status 202."]
+    assert len(sent) == expected
+
+
+def test_alert_queue_full():
+    """Test that an alert is dropped when the queue is full.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from alert_queue import AlertQueue
+    from send_email import FakeTransport
+    q = AlertQueue(FakeTransport(), workers=0, maxsize=1)
+    assert q.put("dr@yourdomain.com", [(1, 160, "2019-11-12 13:05:35.00")])
+    assert not q.put("dr@yourdomain.com",
+                     [(1, 170, "2019-11-12 13:05:36.00")])
+
+
+def test_alert_queue_context():
+    """Test that a mail is sent with the request id of the caller.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from alert_queue import AlertQueue
+    from json_log import current_request_id
+    seen = []
+    q = AlertQueue(lambda to_email, alerts:
+                   seen.append(current_request_id.get()))
+    token = current_request_id.set("abc")
+    try:
+        q.put("dr@yourdomain.com", [(1, 160, "2019-11-12 13:05:35.00")])
+    finally:
+        current_request_id.reset(token)
+    q.join()
+    assert seen == ["abc"]
@@ -0,0 +1,85 @@
+# test_alert_state.py
+import pytest
+
+
+@pytest.mark.parametrize("statuses, e_transitions, e_alerts", [
+    (["not tachycardic", "tachycardic", "tachycardic", "not tachycardic"],
+     [None, "enter", "sustain", "exit"], 1),
+    (["tachycardic", "not tachycardic", "tachycardic"],
+     ["enter", "exit", "enter"], 1),
+    (["tachycardic"] * 12, ["enter"] + ["sustain"] * 11, 2)
+])
+def test_alert_tracker_update(statuses, e_transitions, e_alerts):
+    """Test the episodes and the cooldown of AlertTracker.
+
+    The heart rates come once per 60 seconds and the cooldown is 600
+    seconds, so a long episode sends a reminder after 10 minutes.
+
+    Args:
+        statuses (list): the status of each heart rate.
+        e_transitions (list): the expected transition of each update.
+        e_alerts (int): the expected number of alerts.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from alert_state import AlertTracker
+    sent = []
+    tracker = AlertTracker(lambda e, a: sent.extend(a),
+                           cooldown=600, digest_window=0)
+    transitions = [tracker.update(1, "dr@yourdomain.com", 160,
+                                  "t{}".format(i), status, now=60 * i)
+                   for i, status in enumerate(statuses)]
+    assert transitions == e_transitions
+    assert len(sent) == e_alerts
+
+
+def test_alert_tracker_digest():
+    """Test that the alerts of the same doctor are sent in one digest.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from alert_state import AlertTracker
+    sent = []
+    tracker = AlertTracker(lambda e, a: sent.append((e, a)),
+                           digest_window=60)
+    tracker.update(1, "a@yourdomain.com", 160, "t1", "tachycardic", now=0)
+    tracker.update(2, "a@yourdomain.com", 170, "t2", "tachycardic", now=1)
+    tracker.update(3, "b@yourdomain.com", 180, "t3", "tachycardic", now=2)
+    assert sent == []
+    tracker.flush()
+    assert sorted(sent) == [("a@yourdomain.com", [(1, 160, "t1"),
+                                                  (2, 170, "t2")]),
+                            ("b@yourdomain.com", [(3, 180, "t3")])]
+
+
+def test_alert_tracker_shared(tmp_path):
+    """Test that two server processes share the cooldown of a patient.
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from alert_state import AlertTracker
+    from shared_state import SQLiteState
+    path = str(tmp_path / "state.db")
+    sent = []
+    first = AlertTracker(lambda e, a: sent.extend(a), digest_window=0,
+                         state=SQLiteState(path))
+    second = AlertTracker(lambda e, a: sent.extend(a), digest_window=0,
+                          state=SQLiteState(path))
+    assert first.update(1, "a@b.com", 160, "t1", "tachycardic",
+                        now=0) == "enter"
+    assert second.update(1, "a@b.com", 160, "t2", "tachycardic",
+                         now=60) == "sustain"
+    assert second.update(1, "a@b.com", 90, "t3", "not tachycardic",
+                         now=120) == "exit"
+    assert first.update(1, "a@b.com", 90, "t4", "not tachycardic",
+                        now=180) is None
+    assert sent == [(1, 160, "t1")]
@@ -0,0 +1,61 @@
+# test_config.py
+import json
+import pytest
+
+
+def test_load_config_defaults():
+    """Test that load_config returns the defaults without any setting
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from config import load_config, DEFAULTS
+    assert load_config(environ={}) == DEFAULTS
+
+
+def test_load_config_file_and_environ(tmp_path):
+    """Test that the environment overrides the file of the settings
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from config import load_config
+    path = tmp_path / "hr.json"
+    path.write_text(json.dumps({"storage": "memory", "send_email": False,
+                                "alert_cooldown": 60}))
+    result = load_config(environ={"HR_CONFIG": str(path),
+                                  "HR_SEND_EMAIL": "yes",
+                                  "HR_STATUS_CACHE_TTL": "5"})
+    assert result["storage"] == "memory"
+    assert result["send_email"] is True
+    assert result["alert_cooldown"] == 60
+    assert result["status_cache_ttl"] == 5.0
+
+
+@pytest.mark.parametrize("settings, environ", [
+    ({"workers": 4}, {}),
+    ({}, {"HR_SEND_EMAIL": "maybe"}),
+    ({}, {"HR_ALERT_COOLDOWN": "ten"}),
+])
+def test_load_config_errors(tmp_path, settings, environ):
+    """Test that load_config refuses the wrong settings
+
+    Args:
+        tmp_path: the pytest temporary directory.
+        settings (dict): the settings of the file.
+        environ (dict): the environment variables.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from config import load_config
+    path = tmp_path / "hr.json"
+    path.write_text(json.dumps(settings))
+    with pytest.raises(ValueError):
+        load_config(str(path), environ)
@@ -0,0 +1,182 @@
+# test_hr_asgi.py
+import asyncio
+import json
+import pytest
+
+
+@pytest.fixture
+def server():
+    """Serve hr_server from an empty MemoryStorage.
+
+    Returns:
+        AsgiServer: the server.
+    """
+    import hr_server
+    from config import DEFAULTS
+    from hr_asgi import AsgiServer
+    app = hr_server.create_app(dict(DEFAULTS, storage="memory",
+                                    send_email=False))
+    return AsgiServer(app, workers=4, keep_alive=0.05)
+
+
+def http_scope(method, path, query=b""):
+    """Make the ASGI scope of an http request.
+
+    Args:
+        method (string): the request method.
+        path (string): the request path.
+        query (bytes): the query string.
+
+    Returns:
+        dict: the scope.
+    """
+    return {"type": "http", "method": method, "path": path,
+            "query_string": query, "root_path": "",
+            "headers": [(b"content-type", b"application/json")]}
+
+
+async def request(server, method, path, data=None):
+    """Send a whole request to the server and collect the response.
+
+    Args:
+        server (AsgiServer): the server.
+        method (string): the request method.
+        path (string): the request path.
+        data (dict): the json body.
+
+    Returns:
+        int: the status code.
+        bytes: the body of the response.
+    """
+    body = b"" if data is None else json.dumps(data).encode()
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await server(http_scope(method, path), receive, send)
+    return sent[0]["status"], b"".join(m.get("body", b"")
+                                       for m in sent[1:])
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ([(b"content-type", b"application/json")],
+     {"CONTENT_TYPE": "application/json"}),
+    ([(b"x-request-id", b"a"), (b"x-request-id", b"b")],
+     {"HTTP_X_REQUEST_ID": "a,b"}),
+])
+def test_wsgi_environ(headers, expected):
+    """Test function wsgi_environ
+
+    Args:
+        headers (list): the ASGI headers.
+        expected (dict): the expected keys of the environ.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from hr_asgi import wsgi_environ
+    scope = dict(http_scope("GET", "/api/status/1", b"a=1"),
+                 headers=headers)
+    result = wsgi_environ(scope, b"")
+    assert result["PATH_INFO"] == "/api/status/1"
+    assert result["QUERY_STRING"] == "a=1"
+    for key, value in expected.items():
+        assert result[key] == value
+
+
+def test_wsgi_routes(server):
+    """Test that the Flask routes are served through the ASGI server
+
+    Args:
+        server (AsgiServer): the server.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    async def run():
+        await request(server, "POST", "/api/new_patient",
+                      {"patient_id": 1, "attending_email": "a@b.com",
+                       "patient_age": 40})
+        await request(server, "POST", "/api/heart_rate",
+                      {"patient_id": 1, "heart_rate": 80})
+        return await request(server, "GET", "/api/status/1")
+
+    status, body = asyncio.run(run())
+    assert status == 200
+    assert json.loads(body)["heart_rate"] == 80
+
+
+def test_stream(server):
+    """Test that a stream gets the posted heart rates until it ends
+
+    Args:
+        server (AsgiServer): the server.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    import hr_server
+
+    async def run():
+        await request(server, "POST", "/api/new_patient",
+                      {"patient_id": 1, "attending_email": "a@b.com",
+                       "patient_age": 40})
+        client = asyncio.Queue()
+        await client.put({"type": "http.request", "body": b""})
+        sent = asyncio.Queue()
+        task = asyncio.ensure_future(server(
+            http_scope("GET", "/api/status/stream", b"patient_id=1"),
+            client.get, sent.put))
+        start = await sent.get()
+        status = await sent.get()
+        await request(server, "POST", "/api/heart_rate",
+                      {"patient_id": 1, "heart_rate": 80})
+        events = []
+        while not events or b"event: reading" not in events[-1]:
+            events.append((await sent.get())["body"])
+        await client.put({"type": "http.disconnect"})
+        await asyncio.wait_for(task, 1)
+        return start, status, events
+
+    start, status, events = asyncio.run(run())
+    assert start["status"] == 200
+    assert status["body"].startswith(b"event: status\n")
+    assert b'"heart_rate": 80' in events[-1]
+    state = hr_server.app_state(server.app)
+    assert state.status_broker.subscribers == {}
+
+
+def test_stream_bad_id(server):
+    """Test that a stream of a patient which doesn't exist is refused
+
+    Args:
+        server (AsgiServer): the server.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    async def run():
+        messages = [{"type": "http.request", "body": b""}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await server(http_scope("GET", "/api/status/stream",
+                                b"patient_id=9"), receive, send)
+        return sent
+
+    sent = asyncio.run(run())
+    assert sent[0]["status"] == 400
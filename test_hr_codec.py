@@ -0,0 +1,78 @@
+# test_hr_codec.py
+import pytest
+
+READINGS = [{"t": 1573563935000000, "hr": 80, "s": "not tachycardic"},
+            {"t": 1573563936000000, "hr": 82, "s": "not tachycardic"},
+            {"t": 1573563937000000, "hr": 79, "s": "not tachycardic"},
+            {"t": 1573563938500000, "hr": 121, "s": "tachycardic"}]
+
+
+@pytest.mark.parametrize("n, expected", [
+    (0, 0), (-1, 1), (1, 2), (-2, 3), (2, 4)
+])
+def test_zigzag(n, expected):
+    """Test function zigzag and unzigzag
+
+    Args:
+        n (int): the signed integer.
+        expected (int): the expected unsigned integer.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from hr_codec import zigzag, unzigzag
+    assert zigzag(n) == expected
+    assert unzigzag(expected) == n
+
+
+@pytest.mark.parametrize("n, expected", [
+    (0, b"\x00"), (-64, b"\x7f"), (64, b"\x80\x01"),
+    (1573563935000000, None)
+])
+def test_varint(n, expected):
+    """Test function put_varint and get_varint
+
+    Args:
+        n (int): the signed integer.
+        expected (bytes): the expected encoded bytes, None to skip.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from hr_codec import put_varint, get_varint
+    buf = bytearray(b"\xff")
+    put_varint(buf, n)
+    if expected is not None:
+        assert bytes(buf[1:]) == expected
+    assert get_varint(bytes(buf), 1) == (n, len(buf))
+
+
+@pytest.mark.parametrize("readings", [READINGS, READINGS[:1], []])
+def test_encode_readings(readings):
+    """Test that encoded readings are decoded back to the same ones.
+
+    Args:
+        readings (list): the readings of a bucket.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from hr_codec import encode_readings, decode_readings
+    result = decode_readings(encode_readings(readings))
+    assert result == readings
+
+
+def test_encode_readings_size():
+    """Test that steady readings take about 2 bytes each.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from hr_codec import encode_readings
+    readings = [{"t": 1573563600000000 + i * 1000000, "hr": 80 + i % 3,
+                 "s": "not tachycardic"} for i in range(3600)]
+    assert len(encode_readings(readings)) < 3600 * 2.2
@@ -0,0 +1,73 @@
+# test_hr_export.py
+import pytest
+
+BUCKETS = [[{"t": 1573563935000000, "hr": 80, "s": "not tachycardic"},
+            {"t": 1573563995500000, "hr": 120, "s": "tachycardic"}],
+           [{"t": 1573567200000000, "hr": 90, "s": "not tachycardic"}]]
+
+
+def test_export_arrays():
+    """Test that export_arrays packs the readings into typed arrays.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from hr_export import export_arrays
+    arrays = export_arrays(BUCKETS)
+    assert arrays["heart_rate"].dtype.name == "int16"
+    assert arrays["heart_rate"].tolist() == [80, 120, 90]
+    assert arrays["tachycardic"].tolist() == [False, True, False]
+    assert arrays["timestamp_delta"].dtype.name == "int64"
+    assert arrays["timestamp_delta"].tolist() == \
+        [1573563935000000, 60500000, 3204500000]
+
+
+@pytest.mark.parametrize("hrs, expected", [
+    ([], "int16"),
+    ([80, -32768, 32767], "int16"),
+    ([80, 40000], "int32"),
+    ([-40000], "int32"),
+    ([2 ** 40], "int64")
+])
+def test_hr_type(hrs, expected):
+    """Test that the heart rates get the smallest type which holds them
+
+    Args:
+        hrs (list): the heart rates.
+        expected (string): the expected type name.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from hr_export import export_arrays
+    readings = [{"t": i, "hr": hr, "s": "not tachycardic"}
+                for i, hr in enumerate(hrs)]
+    arrays = export_arrays([readings])
+    assert arrays["heart_rate"].dtype.name == expected
+    assert arrays["heart_rate"].tolist() == hrs
+
+
+@pytest.mark.parametrize("buckets, e_hrs, e_times", [
+    (BUCKETS, [80, 120, 90],
+     [1573563935000000, 1573563995500000, 1573567200000000]),
+    ([], [], [])
+])
+def test_load_npz(buckets, e_hrs, e_times):
+    """Test that an exported .npz file is read back to the readings.
+
+    Args:
+        buckets (list): the lists of readings of the buckets.
+        e_hrs (list): the expected heart rates.
+        e_times (list): the expected timestamps in microseconds.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from hr_export import export_npz, load_npz
+    hrs, statuses, times = load_npz(export_npz(buckets))
+    assert hrs.tolist() == e_hrs
+    assert len(statuses) == len(e_hrs)
+    assert times.tolist() == e_times
@@ -0,0 +1,127 @@
+# test_json_log.py
+import json
+import logging
+import pytest
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    """Log to a file of the test and restore the root logger after it.
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Path: the log file.
+    """
+    from json_log import stop_logging
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield tmp_path / "hr_server.log"
+    stop_logging()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_json_formatter():
+    """Test that JsonFormatter writes the fields and the extras
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from json_log import JsonFormatter
+    record = logging.LogRecord("root", logging.INFO, "", 0,
+                               "* ID %s registered", (5,), None)
+    record.created = 1573918037.548851
+    record.request_id = "abc"
+    record.patient_id = 5
+    assert json.loads(JsonFormatter().format(record)) == {
+        "time": "2019-11-16T15:27:17.548Z", "level": "INFO",
+        "logger": "root", "message": "* ID 5 registered",
+        "request_id": "abc", "patient_id": 5}
+
+
+def test_record_queue_handler():
+    """Test that the queued records are not formatted by the caller
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    import queue
+    from json_log import RecordQueueHandler, RequestIdFilter, \
+        current_request_id
+    records = queue.SimpleQueue()
+    handler = RecordQueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+    args = [5]
+    record = logging.LogRecord("root", logging.INFO, "", 0,
+                               "* ID %s registered", (args,), None)
+    token = current_request_id.set("abc")
+    try:
+        handler.handle(record)
+    finally:
+        current_request_id.reset(token)
+    args.append(6)
+    queued = records.get_nowait()
+    assert queued.getMessage() == "* ID [5] registered"
+    assert queued.request_id == "abc"
+    assert record.args == (args,)
+
+
+def test_start_logging(log_path):
+    """Test that the records are written as json lines in background
+
+    Args:
+        log_path (Path): the log file.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from json_log import start_logging, stop_logging, current_request_id
+    log_path.write_text('{"message": "* Old"}\n')
+    start_logging(str(log_path))
+    logging.info("* First", extra={"patient_id": 1})
+    token = current_request_id.set("abc")
+    try:
+        logging.warning("* Second")
+        logging.debug("* Not logged")
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logging.exception("* Third")
+    finally:
+        current_request_id.reset(token)
+    stop_logging()
+    lines = [json.loads(line) for line in log_path.read_text().split("\n")
+             if line]
+    assert [line["message"] for line in lines] == ["* Old", "* First",
+                                                   "* Second", "* Third"]
+    assert "ZeroDivisionError" in lines[3]["exception"]
+    assert lines[1]["patient_id"] == 1
+    assert "request_id" not in lines[1]
+    assert lines[2]["request_id"] == "abc"
+    assert logging.getLogger().handlers == []
+
+
+def test_start_logging_rotation(log_path):
+    """Test that the log file is rotated at its size limit
+
+    Args:
+        log_path (Path): the log file.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from json_log import start_logging, stop_logging
+    start_logging(str(log_path), max_bytes=200, backup_count=2)
+    for i in range(10):
+        logging.info("* Line {}".format(i))
+    stop_logging()
+    rotated = sorted(log_path.parent.glob("hr_server.log.*"))
+    assert len(rotated) == 2
+    assert log_path.stat().st_size <= 200
@@ -0,0 +1,86 @@
+# test_metrics.py
+import pytest
+
+
+@pytest.mark.parametrize("labels, expected", [
+    ((), ""),
+    ((("route", "/api/status"),), '{route="/api/status"}'),
+    ((("a", 'x"y'), ("b", "c\\d\n")), '{a="x\\"y",b="c\\\\d\\n"}'),
+])
+def test_label_text(labels, expected):
+    """Test function label_text
+
+    Args:
+        labels (tuple): the labels.
+        expected (string): the expected text.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from metrics import label_text
+    assert label_text(labels) == expected
+
+
+def test_histogram():
+    """Test that a Histogram counts each value in its bucket
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from metrics import Histogram
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    counts, total = histogram.snapshot()
+    assert counts == [2, 1, 1]
+    assert total == pytest.approx(2.65)
+
+
+def test_render():
+    """Test that Metrics renders the Prometheus text format
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from metrics import Metrics, Histogram
+    metrics = Metrics()
+    metrics.describe("hr_total", "counter", "Things.")
+    metrics.inc("hr_total", route="/a")
+    metrics.inc("hr_total", 2, route="/a")
+    metrics.histograms[("hr_seconds", ())] = Histogram((0.1,))
+    metrics.observe("hr_seconds", 0.05)
+    metrics.observe("hr_seconds", 0.5)
+    metrics.gauge("hr_depth", lambda: 4)
+    assert metrics.render().split("\n") == [
+        "hr_depth 4",
+        'hr_seconds_bucket{le="0.1"} 1',
+        'hr_seconds_bucket{le="+Inf"} 2',
+        "hr_seconds_sum 0.55",
+        "hr_seconds_count 2",
+        "# HELP hr_total Things.",
+        "# TYPE hr_total counter",
+        'hr_total{route="/a"} 3',
+        "",
+    ]
+
+
+def test_stages():
+    """Test that each stage mark observes the time since the last mark
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from metrics import Metrics
+    metrics = Metrics()
+    stages = metrics.stages("post")
+    stages.mark("validate")
+    stages.mark("save")
+    stages.mark("save")
+    key = ("hr_stage_seconds", (("route", "post"), ("stage", "save")))
+    assert metrics.histograms[key].snapshot()[0][-1] == 0
+    assert sum(metrics.histograms[key].snapshot()[0]) == 2
+    assert len(metrics.histograms) == 2
@@ -0,0 +1,77 @@
+# test_rescore_job.py
+import pytest
+
+
+@pytest.mark.parametrize("fail, e_state, e_done", [
+    (None, "done", 3),
+    (2, "failed", 1)
+])
+def test_rescore_jobs(fail, e_state, e_done):
+    """Test the progress of a re-scoring job.
+
+    Args:
+        fail (int): the patient id whose re-scoring fails.
+        e_state (string): the expected state of the job.
+        e_done (int): the expected number of scored patients.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from rescore_job import RescoreJobs
+
+    def rescore(p_id, progress):
+        if p_id == fail:
+            raise IOError("database is down")
+        progress(10, 1)
+
+    jobs = RescoreJobs(rescore)
+    job_id = jobs.submit([1, 2, 3])
+    jobs.join()
+    job = jobs.get(job_id)
+    assert job["state"] == e_state
+    assert job["patients"] == 3
+    assert job["patients_done"] == e_done
+    assert job["readings"] == 10 * e_done
+    assert job["changed"] == e_done
+
+
+def test_rescore_jobs_keep():
+    """Test that only the latest jobs are kept.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from rescore_job import RescoreJobs
+    jobs = RescoreJobs(lambda p_id, progress: None, keep=2)
+    ids = [jobs.submit([1]) for i in range(3)]
+    jobs.join()
+    assert jobs.get(ids[0]) is None
+    assert jobs.get(ids[2])["state"] == "done"
+
+
+def test_rescore_jobs_shared(tmp_path):
+    """Test that the jobs of one process can be polled from another.
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from rescore_job import RescoreJobs
+    from shared_state import SQLiteState
+    path = str(tmp_path / "state.db")
+    first = RescoreJobs(lambda p_id, progress: progress(2, 1),
+                        state=SQLiteState(path))
+    second = RescoreJobs(lambda p_id, progress: None,
+                         state=SQLiteState(path))
+    a = first.submit([1, 2])
+    b = second.submit([3])
+    first.join()
+    second.join()
+    assert (a, b) == (1, 2)
+    assert second.get(a)["readings"] == 4
+    assert first.get(b)["state"] == "done"
@@ -0,0 +1,159 @@
+# test_shared_state.py
+import multiprocessing
+import pytest
+
+
+@pytest.fixture(params=["local", "sqlite"])
+def state(request, tmp_path):
+    """Make an empty state of each kind with a fake clock.
+
+    Args:
+        request: the pytest request of the parameter.
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        LocalState: the state, whose clock is set by ``state.now[0]``.
+    """
+    from shared_state import LocalState, SQLiteState
+    now = [0]
+    if request.param == "local":
+        s = LocalState(clock=lambda: now[0])
+    else:
+        s = SQLiteState(str(tmp_path / "state.db"), clock=lambda: now[0])
+    s.now = now
+    return s
+
+
+def test_get_set(state):
+    """Test the values and their expiry
+
+    Args:
+        state (LocalState): the state.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    state.set("a", {"x": [1, 2]})
+    state.set("b", 1, ttl=10)
+    assert state.get("a") == {"x": [1, 2]}
+    assert state.get("b") == 1
+    state.now[0] = 10
+    assert state.get("b") is None
+    state.delete("a")
+    assert state.get("a") is None
+
+
+def test_update(state):
+    """Test that update changes a value and returns the result
+
+    Args:
+        state (LocalState): the state.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    def add(n):
+        return (n or 0) + 1, n
+
+    assert state.update("n", add) is None
+    assert state.update("n", add) == 1
+    assert state.update("n", lambda n: (None, "gone")) == "gone"
+    assert state.get("n") is None
+
+
+def add_many(path, n):
+    """Add 1 to a shared counter n times, run by a child process.
+
+    Args:
+        path (string): the path of the state file.
+        n (int): the number of updates.
+
+    Returns:
+        None
+    """
+    from shared_state import SQLiteState
+    state = SQLiteState(path)
+    for i in range(n):
+        state.update("n", lambda v: ((v or 0) + 1, None))
+
+
+def test_sqlite_update_processes(tmp_path):
+    """Test that the updates of several processes are never lost
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from shared_state import SQLiteState
+    path = str(tmp_path / "state.db")
+    state = SQLiteState(path)
+    workers = [multiprocessing.Process(target=add_many, args=(path, 50))
+               for i in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert state.get("n") == 200
+
+
+def test_sqlite_events(tmp_path):
+    """Test that a process only gets the events of the other processes
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from shared_state import SQLiteState
+    path = str(tmp_path / "state.db")
+    first = SQLiteState(path, origin=1)
+    second = SQLiteState(path, origin=2)
+    first.publish("old")
+    after, events = second.events()
+    assert events == []
+    first.publish("a")
+    second.publish("b")
+    first.publish(["c", 1])
+    after, events = second.events(after)
+    assert events == ["a", ["c", 1]]
+    assert second.events(after) == (after, [])
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("local", "LocalState"),
+    ("sqlite:{}/state.db", "SQLiteState"),
+])
+def test_open_state(tmp_path, url, expected):
+    """Test function open_state
+
+    Args:
+        tmp_path: the pytest temporary directory.
+        url (string): the url of the state.
+        expected (string): the expected class name.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from shared_state import open_state
+    result = open_state(url.format(tmp_path))
+    assert type(result).__name__ == expected
+
+
+def test_open_state_error():
+    """Test that open_state refuses an unknown url
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from shared_state import open_state
+    with pytest.raises(ValueError):
+        open_state("redis://localhost")
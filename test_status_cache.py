@@ -0,0 +1,140 @@
+# test_status_cache.py
+import pytest
+
+STATUS = {"heart_rate": 80, "status": "not tachycardic",
+          "timestamp": "2019-11-12 13:05:35.000000"}
+NEWER = {"heart_rate": 120, "status": "tachycardic",
+         "timestamp": "2019-11-12 13:06:35.000000"}
+
+
+@pytest.mark.parametrize("age, expected", [(10, STATUS), (61, None)])
+def test_status_cache_ttl(age, expected):
+    """Test that an entry of StatusCache expires after the ttl.
+
+    Args:
+        age (float): the seconds since the entry is cached.
+        expected (dict): the expected cached status.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from status_cache import StatusCache
+    now = [0]
+    cache = StatusCache(ttl=60, clock=lambda: now[0])
+    status, etag = cache.put(1, STATUS)
+    now[0] = age
+    result = cache.get(1)
+    if expected is None:
+        assert result is None
+    else:
+        assert result == (expected, etag)
+
+
+def test_status_cache_lru():
+    """Test that the least recently used entry is dropped first.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from status_cache import StatusCache
+    cache = StatusCache(maxsize=2)
+    cache.put(1, STATUS)
+    cache.put(2, STATUS)
+    cache.get(1)
+    cache.put(3, STATUS)
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.get(3) is not None
+
+
+@pytest.mark.parametrize("first, second, expected", [
+    (STATUS, NEWER, NEWER),
+    (NEWER, STATUS, NEWER)
+])
+def test_status_cache_update(first, second, expected):
+    """Test that an update never replaces a newer reading.
+
+    Args:
+        first (dict): the cached status.
+        second (dict): the status of the update.
+        expected (dict): the expected cached status.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from status_cache import StatusCache, status_etag
+    cache = StatusCache()
+    cache.update(1, first)
+    assert cache.update(1, second) == (expected, status_etag(expected))
+    assert cache.get(1) == (expected, status_etag(expected))
+
+
+def test_status_cache_update_empty():
+    """Test that the first reading replaces a status without reading.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from status_cache import StatusCache
+    cache = StatusCache()
+    cache.put(1, {"heart_rate": None, "status": None, "timestamp": None})
+    cache.update(1, STATUS)
+    assert cache.get(1)[0] == STATUS
+
+
+@pytest.mark.parametrize("cached, read, expected", [
+    (None, STATUS, STATUS),
+    (NEWER, STATUS, NEWER),
+    (STATUS, NEWER, NEWER),
+    (STATUS, {"heart_rate": None, "status": None, "timestamp": None},
+     STATUS)
+])
+def test_status_cache_put(cached, read, expected):
+    """Test that a status read before a newer post isn't cached.
+
+    Args:
+        cached (dict): the status cached by a post, None if not any.
+        read (dict): the status read from the database.
+        expected (dict): the expected cached status.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from status_cache import StatusCache, status_etag
+    cache = StatusCache()
+    if cached is not None:
+        cache.update(1, cached)
+    assert cache.put(1, read) == (expected, status_etag(expected))
+    assert cache.get(1) == (expected, status_etag(expected))
+
+
+def test_shared_status_cache(tmp_path):
+    """Test that SharedStatusCache is shared by two processes.
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from shared_state import SQLiteState
+    from status_cache import SharedStatusCache, status_etag
+    path = str(tmp_path / "state.db")
+    first = SharedStatusCache(SQLiteState(path))
+    second = SharedStatusCache(SQLiteState(path))
+    old = {"heart_rate": 80, "status": "not tachycardic", "timestamp": "b"}
+    new = {"heart_rate": 90, "status": "not tachycardic", "timestamp": "c"}
+    first.put(1, old)
+    assert second.get(1) == (old, status_etag(old))
+    second.update(1, new)
+    assert first.put(1, old) == (new, status_etag(new))
+    first.update(1, dict(old, timestamp="a"))
+    assert first.get(1) == (new, status_etag(new))
+    second.discard(1)
+    assert first.get(1) is None
@@ -0,0 +1,102 @@
+# test_status_stream.py
+import pytest
+
+
+@pytest.mark.parametrize("event, data, expected", [
+    ("reading", {"patient_id": 1, "heart_rate": 80},
+     'event: reading\ndata: {"patient_id": 1, "heart_rate": 80}\n\n'),
+    ("tachycardia", {"transition": "enter"},
+     'event: tachycardia\ndata: {"transition": "enter"}\n\n')
+])
+def test_sse_event(event, data, expected):
+    """Test function sse_event
+
+    Args:
+        event (string): the event name.
+        data (dict): the event data.
+        expected (string): the expected message.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from status_stream import sse_event
+    result = sse_event(event, data)
+    assert result == expected
+
+
+def test_status_broker():
+    """Test that StatusBroker only sends the events of subscribed ids.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from status_stream import StatusBroker
+    broker = StatusBroker(maxsize=1)
+    sub_a = broker.subscribe([1, 2])
+    sub_b = broker.subscribe([2])
+    assert broker.count() == 2
+    assert broker.publish(1, "reading", {"heart_rate": 80}) == 1
+    assert broker.publish(2, "reading", {"heart_rate": 90}) == 1
+    assert broker.publish(3, "reading", {"heart_rate": 100}) == 0
+    assert sub_a.get(timeout=0) == ("reading", {"heart_rate": 80})
+    assert sub_a.get(timeout=0) is None
+    assert sub_b.get(timeout=0) == ("reading", {"heart_rate": 90})
+    broker.unsubscribe(sub_a)
+    broker.unsubscribe(sub_b)
+    assert broker.subscribers == {}
+    assert broker.count() == 0
+
+
+def test_async_subscription():
+    """Test that an AsyncSubscription wakes up for a published event.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    import asyncio
+    import threading
+    from status_stream import StatusBroker
+
+    async def run():
+        broker = StatusBroker()
+        sub = broker.subscribe([1], asyncio.get_running_loop())
+        timeout = await sub.wait(0.01)
+        threading.Timer(0.01, broker.publish,
+                        (1, "reading", {"heart_rate": 80})).start()
+        event = await sub.wait(5)
+        broker.unsubscribe(sub)
+        return timeout, event
+
+    timeout, event = asyncio.run(run())
+    assert timeout is None
+    assert event == ("reading", {"heart_rate": 80})
+
+
+def test_status_broker_shared(tmp_path):
+    """Test that a stream gets the events published by another process.
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from shared_state import SQLiteState
+    from status_stream import StatusBroker
+    path = str(tmp_path / "state.db")
+    first = StatusBroker(state=SQLiteState(path, origin=1), interval=0.01)
+    second = StatusBroker(state=SQLiteState(path, origin=2), interval=0.01)
+    sub = second.subscribe([1])
+    assert second.follower is not None
+    event = None
+    for i in range(100):
+        first.publish(1, "reading", {"heart_rate": 80})
+        event = sub.get(timeout=0.05)
+        if event is not None:
+            break
+    assert event == ("reading", {"heart_rate": 80})
+    assert first.follower is None
@@ -0,0 +1,269 @@
+# test_storage.py
+import pytest
+
+readings = [
+    {"heart_rate": 90, "status": "not tachycardic",
+     "timestamp": "2019-11-12 13:30:00.000000"},
+    {"heart_rate": 110, "status": "tachycardic",
+     "timestamp": "2019-11-12 13:05:35.000000"},
+    {"heart_rate": 120, "status": "tachycardic",
+     "timestamp": "2019-11-12 15:00:00.500000"},
+]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    """Make an empty storage of each kind with two patients.
+
+    Args:
+        request: the pytest request of the parameter.
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Storage: the storage.
+    """
+    from storage import MemoryStorage, SQLiteStorage
+    from timestamps import to_us
+    if request.param == "memory":
+        s = MemoryStorage()
+    else:
+        s = SQLiteStorage(str(tmp_path / "hr.db"))
+    s.add_patient(1, "a@b.com", 40, to_us("2019-11-12 00:00:00.000000"))
+    s.add_patient(2, "c@d.com", 5, to_us("2019-11-12 00:00:00.000000"))
+    return s
+
+
+def test_patients(store):
+    """Test the patient methods of the storages
+
+    Args:
+        store (Storage): the storage.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from timestamps import to_us
+    store.add_patient(1, "new@b.com", 41, to_us("2019-11-13 00:00:00.0"))
+    assert store.has_patient(1) is True
+    assert store.has_patient(3) is False
+    assert store.patient_ids() == [1, 2]
+    assert store.patients_info([1, 3]) == {1: (41, "new@b.com")}
+    versions = store.versions(1)
+    assert [v["attending_email"] for v in versions] == ["a@b.com",
+                                                        "new@b.com"]
+    assert versions[1]["effective_from"] == to_us("2019-11-13 00:00:00.0")
+
+
+def test_readings(store):
+    """Test that the readings are read back in time order
+
+    Args:
+        store (Storage): the storage.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from timestamps import to_us
+    store.add_readings({1: readings})
+    result = [r for chunk in store.iter_readings(1) for r in chunk]
+    assert [r["hr"] for r in result] == [110, 90, 120]
+    assert result[0]["t"] == to_us("2019-11-12 13:05:35.000000")
+    assert result[0]["s"] == "tachycardic"
+    result = [r["hr"] for chunk in store.iter_readings(
+        1, to_us("2019-11-12 13:05:35.000000"),
+        to_us("2019-11-12 15:00:00.500000")) for r in chunk]
+    assert result == [110, 90]
+    assert list(store.iter_readings(2)) == []
+
+
+def test_latest_and_aggregates(store):
+    """Test the latest status and the running aggregates
+
+    Args:
+        store (Storage): the storage.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    store.add_readings({1: readings})
+    store.add_readings({1: readings[:1]})
+    assert store.latest() == [
+        (1, {"heart_rate": 120, "status": "tachycardic",
+             "timestamp": "2019-11-12 15:00:00.500000"}),
+        (2, {"heart_rate": None, "status": None, "timestamp": None})]
+    assert [p[0] for p in store.latest([1, 2, 3], after=1)] == [2]
+    assert [p[0] for p in store.latest(limit=1)] == [1]
+    assert store.aggregates(1) == (4, 410, 42700, 90, 120)
+    assert store.aggregates(2) is None
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    ("2019-11-12 13:05:35.000000", None, (3, 320)),
+    ("2019-11-12 13:05:35.000001", None, (2, 210)),
+    ("2019-11-12 13:00:00.000000", "2019-11-12 15:00:00.500000", (2, 200)),
+    ("2019-11-12 16:00:00.000000", None, (0, 0)),
+    ("2019-11-12 00:00:00.000000", "2019-11-13 00:00:00.000000", (3, 320)),
+    ("2019-01-01 00:00:00.000000", "2020-01-01 00:00:00.000000", (3, 320)),
+    ("2019-11-12 13:10:00.000000", "2019-11-12 15:00:00.000000", (1, 90)),
+    ("2019-11-12 14:00:00.000000", "2019-11-12 15:00:00.000000", (0, 0)),
+])
+def test_totals(store, start, end, expected):
+    """Test the count and the sum of the heart rates in a time range
+
+    Args:
+        store (Storage): the storage.
+        start (string): the start of the range, included.
+        end (string): the end of the range, excluded.
+        expected (tuple): the expected count and sum.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from timestamps import to_us
+    store.add_readings({1: readings})
+    end_t = None if end is None else to_us(end)
+    assert store.totals(1, to_us(start), end_t) == expected
+
+
+def test_sqlite_totals_backfill(tmp_path):
+    """Test that the totals of an older SQLite file are added up once
+
+    Args:
+        tmp_path: the pytest temporary directory.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from storage import SQLiteStorage
+    from timestamps import to_us
+    path = str(tmp_path / "hr.db")
+    old = SQLiteStorage(path)
+    old.add_patient(1, "a@b.com", 40, 0)
+    old.add_readings({1: readings})
+    with old.connection() as conn:
+        conn.execute("DELETE FROM reading_total")
+    store = SQLiteStorage(path)
+    assert store.totals(1, to_us("2019-11-01 00:00:00.000000"),
+                        to_us("2019-12-01 00:00:00.000000")) == (3, 320)
+    assert store.totals(1, to_us("2019-11-12 13:10:00.000000")) == (2, 210)
+
+
+def test_rescore(store):
+    """Test that the readings are classified again with their ages
+
+    Args:
+        store (Storage): the storage.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from timestamps import to_us
+    store.add_readings({1: readings})
+    store.add_patient(1, "a@b.com", 5, to_us("2019-11-12 14:00:00.0"))
+    calls = []
+    changed = store.rescore(1, lambda n, c: calls.append((n, c)), chunk=2)
+    assert changed == 1
+    result = [r["s"] for chunk in store.iter_readings(1) for r in chunk]
+    assert result == ["tachycardic", "not tachycardic", "not tachycardic"]
+    assert sum(n for n, c in calls) == 3
+    assert sum(c for n, c in calls) == 1
+    assert store.latest([1])[0][1]["status"] == "not tachycardic"
+
+
+def test_memory_rescore_chunks():
+    """Test that MemoryStorage lets the posts in between the chunks
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    import threading
+    from storage import MemoryStorage
+    from timestamps import to_us
+    store = MemoryStorage()
+    store.add_patient(1, "a@b.com", 40, to_us("2019-11-12 00:00:00.0"))
+    store.add_readings({1: readings})
+    store.add_patient(1, "a@b.com", 5, to_us("2019-11-12 14:00:00.0"))
+    posted = []
+
+    def post(n, c):
+        if len(posted) == 2:
+            return
+        late = {"heart_rate": 150, "status": "tachycardic",
+                "timestamp": "2019-11-12 16:00:0{}.0".format(len(posted))}
+        t = threading.Thread(target=store.add_readings, args=({1: [late]},))
+        t.start()
+        t.join(1)
+        posted.append(not t.is_alive())
+
+    changed = store.rescore(1, post, chunk=1)
+    assert changed == 1
+    assert posted == [True, True]
+    result = [r["s"] for chunk in store.iter_readings(1) for r in chunk]
+    assert result == ["tachycardic", "not tachycardic", "not tachycardic",
+                      "tachycardic", "tachycardic"]
+
+
+def test_lazy_storage():
+    """Test that LazyStorage opens its storage once at the first use
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from storage import LazyStorage, MemoryStorage
+    opened = []
+
+    def opener():
+        opened.append(MemoryStorage())
+        return opened[-1]
+
+    lazy = LazyStorage(opener)
+    assert opened == []
+    lazy.add_patient(1, "a@b.com", 40, 0)
+    assert lazy.has_patient(1) is True
+    assert len(opened) == 1
+
+
+def test_metered_storage():
+    """Test that MeteredStorage times each call and each chunk
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from storage import MeteredStorage, MemoryStorage
+    observed = []
+    metered = MeteredStorage(MemoryStorage(),
+                             lambda name, t: observed.append(name))
+    metered.add_patient(1, "a@b.com", 40, 0)
+    metered.add_readings({1: [{"heart_rate": 80, "status": "not tachycardic",
+                               "timestamp": "2020-01-01 00:00:00.000000"}]})
+    chunks = list(metered.iter_readings(1))
+    assert len(chunks) == 1
+    assert observed == ["add_patient", "add_readings",
+                        "iter_readings", "iter_readings"]
+
+
+def test_storage_abstract():
+    """Test that a storage which misses a method can't be made
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from storage import Storage, MemoryStorage
+
+    class PartialStorage(Storage):
+        def has_patient(self, p_id):
+            return False
+
+    with pytest.raises(TypeError):
+        PartialStorage()
+    assert isinstance(MemoryStorage(), Storage)
@@ -0,0 +1,70 @@
+# test_tachycardia.py
+import pytest
+
+
+@pytest.mark.parametrize("age, expected", [
+    (0.5, -1), (1, 151), (2.5, 151), (3, 137), (4.5, 137), (7.5, 133),
+    (11.5, 130), (15, 119), (15.5, 119), (16, 100), (80, 100)
+])
+def test_hr_limit(age, expected):
+    """Test function hr_limit
+
+    Args:
+        age (float): the patient age.
+        expected (int): the expected limit of the heart rate.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from tachycardia import hr_limit
+    result = hr_limit(age)
+    assert result == expected
+
+
+def test_classify():
+    """Test that classify agrees with hr_limit for every age and rate.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from tachycardia import classify, hr_limit
+    ages = [a / 2 for a in range(0, 50)]
+    hrs = list(range(90, 160))
+    pairs = [(a, hr) for a in ages for hr in hrs]
+    result = classify([p[0] for p in pairs], [p[1] for p in pairs])
+    assert result.tolist() == [hr > hr_limit(a) for a, hr in pairs]
+
+
+def test_classify_one_age():
+    """Test that classify takes a single age for all heart rates.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from tachycardia import classify
+    result = classify(20, [90, 100, 101])
+    assert result.tolist() == [False, False, True]
+
+
+@pytest.mark.parametrize("versions, times, expected", [
+    ([(10, 40)], [5, 10, 20], [40, 40, 40]),
+    ([(10, 40), (20, 5)], [5, 19, 20, 30], [40, 40, 5, 5])
+])
+def test_ages_at(versions, times, expected):
+    """Test function ages_at
+
+    Args:
+        versions (list): the (effective time, age) of the versions.
+        times (list): the reading times.
+        expected (list): the expected ages.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from tachycardia import ages_at
+    result = ages_at(versions, times)
+    assert result == expected
@@ -0,0 +1,53 @@
+# test_timestamps.py
+import pytest
+from datetime import datetime
+
+
+@pytest.mark.parametrize("timestamp, expected", [
+    ("1970-01-01 00:00:00.000000", 0),
+    ("2019-11-12 13:05:35.00", 1573563935000000),
+    ("2019-11-12 13:05:35.123456", 1573563935123456)
+])
+def test_to_us(timestamp, expected):
+    """Test function to_us and its inverse from_us
+
+    Args:
+        timestamp (string): the timestamp of a reading.
+        expected (int): the expected microseconds since the epoch.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from timestamps import to_us, from_us
+    result = to_us(timestamp)
+    assert result == expected
+    assert to_us(from_us(result)) == expected
+
+
+@pytest.mark.parametrize("start_t, end_t, e_periods, e_partial", [
+    (datetime(2019, 11, 12, 13, 30), datetime(2019, 11, 12, 13, 45),
+     [], [(datetime(2019, 11, 12, 13, 30), datetime(2019, 11, 12, 13, 45))]),
+    (datetime(2019, 11, 30, 22), datetime(2019, 12, 2, 1, 30),
+     ["2019-11-30 22", "2019-11-30 23", "2019-12-01", "2019-12-02 00"],
+     [(datetime(2019, 12, 2, 1), datetime(2019, 12, 2, 1, 30))]),
+    (datetime(2019, 12, 1), datetime(2021, 2, 1),
+     ["2019-12", "2020", "2021-01"], [])
+])
+def test_window_parts(start_t, end_t, e_periods, e_partial):
+    """Test function window_parts
+
+    Args:
+        start_t (datetime): the start of the window.
+        end_t (datetime): the end of the window.
+        e_periods (list): the expected prefixes of the whole periods.
+        e_partial (list): the expected partial hours.
+
+    Returns:
+        Error if the test fails
+        Pass if the test passes
+    """
+    from timestamps import window_parts
+    periods, partial = window_parts(start_t, end_t)
+    assert periods == e_periods
+    assert partial == e_partial
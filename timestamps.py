@@ -0,0 +1,136 @@
+# timestamps.py
+from datetime import datetime, timedelta
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+EPOCH = datetime(1970, 1, 1)
+
+
+def datetime_us(t):
+    """Convert a datetime to the microseconds since 1970-01-01.
+
+    Args:
+        t (datetime): the time.
+
+    Returns:
+        int: the microseconds since the epoch.
+    """
+    delta = t - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 \
+        + delta.microseconds
+
+
+def us_datetime(t):
+    """Convert the microseconds since 1970-01-01 to a datetime.
+
+    Args:
+        t (int): the microseconds since the epoch.
+
+    Returns:
+        datetime: the time.
+    """
+    return EPOCH + timedelta(microseconds=t)
+
+
+def to_us(timestamp):
+    """Convert a timestamp to the microseconds since 1970-01-01.
+
+    Args:
+        timestamp (string): the timestamp with the format of
+        "year-month-day hour:mimute:second.microsecond".
+
+    Returns:
+        int: the microseconds since the epoch.
+    """
+    return datetime_us(datetime.strptime(timestamp, TIME_FORMAT))
+
+
+def from_us(t):
+    """Convert the microseconds since 1970-01-01 to a timestamp.
+
+    Args:
+        t (int): the microseconds since the epoch.
+
+    Returns:
+        string: the timestamp with the format of
+        "year-month-day hour:mimute:second.microsecond".
+    """
+    return us_datetime(t).strftime(TIME_FORMAT)
+
+
+def next_period(t, level):
+    """Get the start of the next hour, day, month or year.
+
+    Args:
+        t (datetime): the start of the current period.
+        level (int): the length of the timestamp prefix of the period,
+        13 for hour, 10 for day, 7 for month and 4 for year.
+
+    Returns:
+        datetime: the start of the next period.
+    """
+    if level == 13:
+        return t + timedelta(hours=1)
+    if level == 10:
+        return t + timedelta(days=1)
+    if level == 7:
+        return t.replace(year=t.year + t.month // 12,
+                         month=t.month % 12 + 1)
+    return t.replace(year=t.year + 1)
+
+
+def is_period_start(t, level):
+    """Check if the time is the start of an hour, day, month or year.
+
+    Args:
+        t (datetime): the time.
+        level (int): the length of the timestamp prefix of the period,
+        13 for hour, 10 for day, 7 for month and 4 for year.
+
+    Returns:
+        bool: True if the time starts a period of the level.
+    """
+    if t.minute or t.second or t.microsecond:
+        return False
+    if level <= 10 and t.hour:
+        return False
+    if level <= 7 and t.day != 1:
+        return False
+    if level <= 4 and t.month != 1:
+        return False
+    return True
+
+
+def window_parts(start_t, end_t):
+    """Split a time window into whole periods and partial hours.
+
+    The window [start_t, end_t) is covered from the start by the
+    longest whole year, month, day or hour which starts at the
+    current time and ends inside the window. The parts of an hour at
+    the two ends of the window are left as partial hours. So a window
+    of any length has at most about a hundred parts, plus one per
+    whole year.
+
+    Args:
+        start_t (datetime): the start of the window, included.
+        end_t (datetime): the end of the window, excluded.
+
+    Returns:
+        list: the timestamp prefixes of the whole periods.
+        list: the (start, end) datetimes of the partial hours.
+    """
+    periods = []
+    partial = []
+    t = start_t
+    while t < end_t:
+        for level in (4, 7, 10, 13):
+            if is_period_start(t, level) and \
+                    next_period(t, level) <= end_t:
+                periods.append(t.strftime(TIME_FORMAT)[:level])
+                t = next_period(t, level)
+                break
+        else:
+            hour = t.replace(minute=0, second=0, microsecond=0)
+            t_next = min(next_period(hour, 13), end_t)
+            partial.append((t, t_next))
+            t = t_next
+    return periods, partial